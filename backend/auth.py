@@ -2,20 +2,34 @@
 Authentication module for API key validation.
 Uses FastAPI dependency injection pattern.
 """
-from fastapi import HTTPException, Security, status
+import hmac
+from functools import lru_cache
+
+from fastapi import Depends, HTTPException, Security, status
 from fastapi.security import APIKeyHeader
 
-from config import settings
+from config import get_settings
 
-# Define the API key header name
+# Define the API key header name. The scheme is built once here and shared
+# by every route so FastAPI resolves it against a single stable instance.
 API_KEY_NAME = "X-API-KEY"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
 
 
+@lru_cache(maxsize=1)
+def _api_key_bytes() -> bytes:
+    """UTF-8 encoded configured API key, resolved once on first use."""
+    return get_settings().internal_api_key.encode("utf-8")
+
+
 async def get_api_key(api_key: str = Security(api_key_header)) -> str:
     """
     Validates the API key from the request header.
     
+    Kept as ``async def`` on purpose: it never awaits, so FastAPI runs it
+    inline on the event loop, whereas a plain ``def`` dependency would be
+    dispatched to the threadpool on every request.
+    
     Args:
         api_key: The API key extracted from the X-API-KEY header
         
@@ -25,10 +39,14 @@ async def get_api_key(api_key: str = Security(api_key_header)) -> str:
     Raises:
         HTTPException: 401 if the API key is invalid or missing
     """
-    if api_key != settings.internal_api_key:
+    # Constant-time comparison to avoid leaking the key through timing
+    if not hmac.compare_digest(api_key.encode("utf-8"), _api_key_bytes()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key",
             headers={"WWW-Authenticate": "ApiKey"},
         )
-    return api_key
\ No newline at end of file
+    return api_key
+
+# Shared route-level dependency, so every route references the same object
+require_api_key = Depends(get_api_key)
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from typing import Optional
+from functools import lru_cache
 import os
 from pathlib import Path
 
@@ -51,8 +52,17 @@ class Settings(BaseSettings):
     log_level: str = Field(default="INFO", description="Logging level")
     max_content_size: int = Field(default=1_000_000, description="Maximum document content size in bytes (default 1MB)")
     
+    # Document Processing
+    ingest_workers: int = Field(default=4, ge=1, description="Number of worker tasks processing queued documents")
+    ingest_queue_size: int = Field(default=1000, ge=1, description="Maximum number of documents waiting for processing")
+    ingest_batch_size: int = Field(default=16, ge=1, description="Maximum number of queued documents indexed in one pipeline run")
+    ingest_batch_window: float = Field(default=0.2, ge=0, description="Seconds a worker waits to fill a batch after taking a document")
+    pipeline_workers: int = Field(default=8, ge=1, description="Threads dedicated to running the indexing pipeline")
+    retry_concurrency: int = Field(default=4, ge=1, description="Failed documents reprocessed concurrently per retry cycle")
+    
     # Feature Flags
     use_async_db: bool = Field(default=False, description="Use async database operations with connection pooling")
+    async_pool_size: int = Field(default=10, ge=1, description="Idle connections kept open per async database pool")
     
     # Testing
     testing: bool = Field(default=False, description="Running in test mode")
@@ -65,10 +75,20 @@ class Settings(BaseSettings):
         ],
         "env_file_encoding": "utf-8",
         "case_sensitive": False,
-        "extra": "ignore"
+        "extra": "ignore",
+        # Build the validator on first instantiation rather than at import time
+        "defer_build": True
     }
 
 
-# Create a singleton instance
-# Pydantic will automatically load from env_file list defined in Config class
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the cached Settings instance.
+    
+    Settings (and the env files they read) are loaded lazily on first call
+    instead of at import time. Tests can override via
+    app.dependency_overrides or by calling get_settings.cache_clear().
+    """
+    # Pydantic will automatically load from env_file list defined in model_config
+    return Settings()
@@ -1,26 +1,211 @@
 import sqlite3
+import queue
+import threading
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, Optional
 import logging
 from pathlib import Path
 
-from config import settings
+from config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Idle connections kept for reuse; connections beyond this are closed on release
+POOL_SIZE = 32
+
+# Shared pool of pre-initialized connections (LIFO keeps the hottest ones in use)
+_POOL: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=POOL_SIZE)
+
+# Single-connection writer pool so writers queue here instead of contending for the lock
+_writer_lock = threading.Lock()
+_writer_conn: Optional[sqlite3.Connection] = None
+
+# Shared-cache in-memory database used in place of the file in test mode
+MEMORY_DB_URI = "file::memory:?cache=shared"
+
+# Keeps the shared in-memory database alive while pooled connections come and go
+_memref: Optional[sqlite3.Connection] = None
+
+# Connection-scoped pragmas applied to every new connection:
+# - synchronous=NORMAL is safe under WAL and avoids an fsync per commit
+# - cache_size=-20000 gives a 20MB page cache
+# - temp_store=MEMORY keeps temp B-trees and sorters in RAM
+# - mmap_size lets reads go through mmap rather than pread
+# - wal_autocheckpoint bounds WAL growth to ~1000 pages between checkpoints
+# journal_mode=WAL is persistent in the file and is set once by ensure_wal()
+_BOOTSTRAP_SQL = (
+    "PRAGMA foreign_keys=ON;"
+    "PRAGMA busy_timeout=30000;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-20000;"
+    "PRAGMA mmap_size=268435456;"
+    "PRAGMA wal_autocheckpoint=1000;"
+)
+
+
+# Per-connection prepared statement LRU; the repositories issue a few dozen
+# distinct statements, so the stdlib default of 128 leaves no headroom for
+# the per-page-size IN-list variants
+STATEMENT_CACHE_SIZE = 256
+
+
+class TunedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that applies the bootstrap pragmas as soon as it opens.
+    
+    Passed as ``factory=`` to sqlite3.connect (directly here, and through
+    aiosqlite by the databases library) so every connection either path
+    opens is tuned the same way, not just the one that ran init_db. It
+    also enlarges the prepared statement cache so repeated repository
+    queries skip re-parsing.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("cached_statements", STATEMENT_CACHE_SIZE)
+        super().__init__(*args, **kwargs)
+        self.executescript(_BOOTSTRAP_SQL)
+
+
+# Full schema DDL, submitted in one round-trip by both init_db implementations
+SCHEMA_SQL = """
+-- Documents table with all required fields including audit columns
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    source_url TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    processing_error TEXT,
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    max_retries INTEGER NOT NULL DEFAULT 3,
+    next_attempt_at TEXT,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    CHECK (status IN ('pending', 'processing', 'completed', 'failed'))
+);
+
+-- Indexes for frequently queried fields
+-- Retry scans only ever look at failed rows, oldest first; a partial index keeps
+-- that B-tree small and untouched by updates to rows in other statuses, and the
+-- trailing retry columns let the scan filter ineligible rows inside the index
+DROP INDEX IF EXISTS idx_documents_status;
+DROP INDEX IF EXISTS idx_documents_failed;
+CREATE INDEX IF NOT EXISTS idx_documents_retry
+    ON documents(created_at, retry_count, next_attempt_at) WHERE status = 'failed';
+CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(type);
+CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at);
+
+-- document_links table for many-to-many relationships
+CREATE TABLE IF NOT EXISTS document_links (
+    source_doc_id TEXT NOT NULL,
+    target_doc_id TEXT NOT NULL,
+    PRIMARY KEY (source_doc_id, target_doc_id),
+    FOREIGN KEY (source_doc_id) REFERENCES documents(id) ON DELETE CASCADE,
+    FOREIGN KEY (target_doc_id) REFERENCES documents(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_document_links_source ON document_links(source_doc_id);
+CREATE INDEX IF NOT EXISTS idx_document_links_target ON document_links(target_doc_id);
+
+-- document_tags table for storing tags
+CREATE TABLE IF NOT EXISTS document_tags (
+    document_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (document_id, tag),
+    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags(tag);
+"""
+
 
 def get_db_connection() -> sqlite3.Connection:
     """Gets a new database connection with row_factory configured."""
+    global _memref
+    settings = get_settings()
     # Use check_same_thread=False to allow connections across threads
-    conn = sqlite3.connect(settings.sqlite_db_path, check_same_thread=False)
+    if settings.testing:
+        # No fsync or WAL checkpoints in tests; the database lives only in memory
+        if _memref is None:
+            _memref = sqlite3.connect(MEMORY_DB_URI, uri=True, check_same_thread=False)
+        conn = sqlite3.connect(
+            MEMORY_DB_URI, uri=True, check_same_thread=False, factory=TunedConnection
+        )
+    else:
+        conn = sqlite3.connect(
+            settings.sqlite_db_path, check_same_thread=False, factory=TunedConnection
+        )
     conn.row_factory = sqlite3.Row  # Allows accessing columns by name
+    return conn
+
+
+@contextmanager
+def write_tx(conn: sqlite3.Connection) -> Generator[sqlite3.Connection, None, None]:
+    """
+    Run a writing transaction that takes the write lock upfront.
     
-    # Apply critical pragmas for each connection
-    conn.execute("PRAGMA foreign_keys = ON")
-    conn.execute("PRAGMA journal_mode=WAL")  # Better concurrent access
-    conn.execute("PRAGMA busy_timeout=30000")  # 30 second timeout
+    BEGIN IMMEDIATE avoids the deferred reader-to-writer upgrade, which
+    can fail with SQLITE_BUSY without honouring busy_timeout.
+    Commits on success and rolls back on any error.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def ensure_wal() -> None:
+    """
+    Switch the database file to WAL journal mode.
     
-    return conn
+    journal_mode=WAL is stored in the database file itself, so this only
+    needs to run once per process start (from the app lifespan) rather than
+    on every connection.
+    """
+    settings = get_settings()
+    if settings.testing:
+        # The in-memory test database has no journal file to switch
+        return
+    
+    db_path = Path(settings.sqlite_db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    conn = sqlite3.connect(str(db_path))
+    try:
+        result = conn.execute("PRAGMA journal_mode=WAL").fetchone()
+        logger.info(f"SQLite journal mode set to: {result[0] if result else 'unknown'}")
+    finally:
+        conn.close()
+
+
+def optimize() -> None:
+    """
+    Run PRAGMA optimize so the query planner statistics track table growth.
+    Intended to be called periodically from a background task.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+
+def wal_checkpoint() -> tuple:
+    """
+    Checkpoint the WAL back into the database file and truncate it.
+    
+    Returns:
+        Tuple of (busy, log_frames, checkpointed_frames) as reported by SQLite
+    """
+    conn = get_db_connection()
+    try:
+        return tuple(conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+    finally:
+        conn.close()
 
 
 def init_db():
@@ -28,6 +213,7 @@ def init_db():
     Initializes the database and creates tables if they don't exist.
     This is intended to be called once on application startup.
     """
+    settings = get_settings()
     logger.info(f"Initializing database at {settings.sqlite_db_path}...")
     
     # Ensure directory exists
@@ -36,92 +222,10 @@ def init_db():
     
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Enable WAL mode for better concurrent access
-            cursor.execute("PRAGMA journal_mode=WAL")
-            result = cursor.fetchone()
-            logger.info(f"SQLite journal mode set to: {result[0] if result else 'unknown'}")
-            
-            # Set busy timeout to 30 seconds to handle concurrent access
-            cursor.execute("PRAGMA busy_timeout=30000")
-            logger.info("SQLite busy timeout set to 30 seconds")
-            
-            # Create documents table with all required fields including audit columns
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id TEXT PRIMARY KEY,
-                type TEXT NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                source_url TEXT,
-                status TEXT NOT NULL DEFAULT 'pending',
-                processing_error TEXT,
-                retry_count INTEGER NOT NULL DEFAULT 0,
-                max_retries INTEGER NOT NULL DEFAULT 3,
-                next_attempt_at TEXT,
-                last_error TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                CHECK (status IN ('pending', 'processing', 'completed', 'failed'))
-            )
-            """)
-            
-            # Create indexes for frequently queried fields
-            cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_documents_status 
-            ON documents(status)
-            """)
-            
-            cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_documents_type 
-            ON documents(type)
-            """)
-            
-            cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_documents_created_at 
-            ON documents(created_at)
-            """)
-            
-            # Create document_links table for many-to-many relationships
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS document_links (
-                source_doc_id TEXT NOT NULL,
-                target_doc_id TEXT NOT NULL,
-                PRIMARY KEY (source_doc_id, target_doc_id),
-                FOREIGN KEY (source_doc_id) REFERENCES documents(id) ON DELETE CASCADE,
-                FOREIGN KEY (target_doc_id) REFERENCES documents(id) ON DELETE CASCADE
-            )
-            """)
-            
-            # Create indexes for document_links
-            cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_document_links_source 
-            ON document_links(source_doc_id)
-            """)
-            
-            cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_document_links_target 
-            ON document_links(target_doc_id)
-            """)
-            
-            # Create document_tags table for storing tags
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS document_tags (
-                document_id TEXT NOT NULL,
-                tag TEXT NOT NULL,
-                PRIMARY KEY (document_id, tag),
-                FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
-            )
-            """)
-            
-            # Create index for tag lookups
-            cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_document_tags_tag 
-            ON document_tags(tag)
-            """)
-            
-            conn.commit()
+            # Run all schema DDL in one script inside a single immediate transaction.
+            # executescript commits any pending transaction first, so BEGIN/COMMIT
+            # are part of the script itself.
+            conn.executescript(f"BEGIN IMMEDIATE;{SCHEMA_SQL}COMMIT;")
             
         logger.info("Database initialized successfully.")
         
@@ -130,15 +234,80 @@ def init_db():
         raise
 
 
+def _acquire(pool: "queue.LifoQueue[sqlite3.Connection]") -> sqlite3.Connection:
+    """Borrow an idle connection from the pool, creating one if none is idle."""
+    try:
+        return pool.get_nowait()
+    except queue.Empty:
+        return get_db_connection()
+
+
+def _release(pool: "queue.LifoQueue[sqlite3.Connection]", conn: sqlite3.Connection) -> None:
+    """Return a connection to the pool, closing it if the pool is already full."""
+    try:
+        # Never hand out a connection with a transaction left open
+        if conn.in_transaction:
+            conn.rollback()
+        pool.put_nowait(conn)
+    except (queue.Full, sqlite3.Error):
+        conn.close()
+
+
+@contextmanager
+def pooled_connection() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Borrow a pooled connection outside a request, e.g. in background tasks.
+    Keep the block short so the connection is not held across slow work.
+    """
+    yield from get_db()
+
+
+@contextmanager
+def write_connection() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Borrow the single writer connection for one write.
+    Blocks until the writer is free, so call it off the event loop and keep
+    the block to the write itself; nothing else can write while it is held.
+    """
+    yield from get_write_db()
+
+
 def get_db() -> Generator[sqlite3.Connection, None, None]:
     """
     FastAPI dependency to get a DB connection for a single request.
-    Ensures the connection is closed after the request is finished.
+    Borrows a connection from the pool and returns it once the request is
+    finished. Connections that hit a database error are closed instead.
     """
-    conn = None
+    conn = _acquire(_POOL)
+    broken = False
     try:
-        conn = get_db_connection()
         yield conn
+    except sqlite3.Error:
+        broken = True
+        raise
     finally:
-        if conn:
+        if broken:
             conn.close()
+        else:
+            _release(_POOL, conn)
+
+
+def get_write_db() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Yield the single pooled writer connection.
+    Blocks until the writer is free, so at most one writer is active.
+    """
+    global _writer_conn
+    with _writer_lock:
+        if _writer_conn is None:
+            _writer_conn = get_db_connection()
+        try:
+            yield _writer_conn
+        except sqlite3.Error:
+            # Drop a possibly broken writer; the next borrower opens a fresh one
+            _writer_conn.close()
+            _writer_conn = None
+            raise
+        finally:
+            if _writer_conn is not None and _writer_conn.in_transaction:
+                _writer_conn.rollback()
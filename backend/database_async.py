@@ -3,25 +3,139 @@ Async database module using databases library with aiosqlite.
 This module provides async database operations with connection pooling.
 """
 import logging
+import sqlite3
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from functools import lru_cache
+from typing import AsyncGenerator, List, Optional
 
+import aiosqlite
 from databases import Database
+from databases.backends.sqlite import SQLiteBackend, SQLitePool
+from databases.core import Connection, DatabaseURL
+from sqlalchemy.dialects.sqlite import pysqlite
 
-from config import settings
+from config import get_settings
+from database import MEMORY_DB_URI, SCHEMA_SQL, TunedConnection
 
 logger = logging.getLogger(__name__)
 
-# Create database URL for SQLite with aiosqlite driver
-DATABASE_URL = f"sqlite+aiosqlite:///{settings.sqlite_db_path}"
 
-# Create global database instance with connection pooling
-# force_rollback is enabled in test mode for transaction isolation
-database = Database(
-    DATABASE_URL,
-    force_rollback=settings.testing
-)
+class _ReusingSQLitePool(SQLitePool):
+    """
+    SQLitePool that keeps released connections open for the next acquire.
+    
+    The stock pool opens a fresh aiosqlite connection, with its own worker
+    thread and bootstrap pragmas, for every query and closes it afterwards.
+    Up to max_idle connections are kept here instead; the pool is only used
+    from the event loop, so the list needs no lock.
+    """
+    
+    def __init__(self, url: DatabaseURL, max_idle: int, **options) -> None:
+        super().__init__(url, **options)
+        self._max_idle = max_idle
+        self._idle: List[aiosqlite.Connection] = []
+    
+    async def acquire(self) -> aiosqlite.Connection:
+        if self._idle:
+            return self._idle.pop()
+        return await super().acquire()
+    
+    async def release(self, connection: aiosqlite.Connection) -> None:
+        # A connection left mid-transaction is closed, which rolls it back
+        if len(self._idle) < self._max_idle and not connection.in_transaction:
+            self._idle.append(connection)
+            return
+        await super().release(connection)
+    
+    async def close(self) -> None:
+        """Close every idle connection."""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await super().release(connection)
+
+
+class PooledSQLiteBackend(SQLiteBackend):
+    """
+    SQLite backend whose connections persist across queries.
+    
+    SQLiteBackend.__init__ builds a stock SQLitePool (and, for shared-cache
+    URLs, opens a connection to keep the database alive), so it is not called;
+    the same attributes are set here with the reusing pool. Relies on the
+    internals of the databases version pinned in requirements.in.
+    """
+    
+    def __init__(self, database_url, **options) -> None:
+        max_idle = options.pop("pool_size")
+        self._database_url = DatabaseURL(database_url)
+        self._options = options
+        self._dialect = pysqlite.dialect(paramstyle="qmark")
+        # aiosqlite does not support decimals
+        self._dialect.supports_native_decimal = False
+        self._pool = _ReusingSQLitePool(self._database_url, max_idle, **options)
+    
+    async def disconnect(self) -> None:
+        await self._pool.close()
+        await super().disconnect()
+
+
+class PooledDatabase(Database):
+    """Database that routes sqlite URLs to PooledSQLiteBackend."""
+    
+    SUPPORTED_BACKENDS = {
+        **Database.SUPPORTED_BACKENDS,
+        "sqlite": "database_async:PooledSQLiteBackend",
+    }
+
+
+@lru_cache(maxsize=1)
+def get_database_instance() -> Database:
+    """
+    Returns the write pool, built on first use.
+    
+    WAL allows a single writer, so all mutations and DDL go here. In test mode
+    the pool targets a shared in-memory database with force_rollback. Construction
+    is deferred so this follows the settings in effect when the pool is first
+    requested; tests can call get_database_instance.cache_clear()
+    after changing settings instead of reloading this module.
+    """
+    settings = get_settings()
+    if settings.testing:
+        # Same shared in-memory database as the sync path; force_rollback
+        # still isolates each test inside one transaction
+        return PooledDatabase(
+            f"sqlite+aiosqlite:///{MEMORY_DB_URI}",
+            force_rollback=True,
+            uri=True,
+            factory=TunedConnection,
+            pool_size=settings.async_pool_size
+        )
+    # factory applies the pragmas on every connection the pool opens
+    return PooledDatabase(
+        f"sqlite+aiosqlite:///{settings.sqlite_db_path}",
+        factory=TunedConnection,
+        pool_size=settings.async_pool_size
+    )
+
+
+@lru_cache(maxsize=1)
+def get_read_database_instance() -> Database:
+    """
+    Returns the read pool, built on first use.
+    
+    Readers open the same file as a read-only URI so they never take the write
+    lock. In test mode reads share the rollback connection so they see
+    uncommitted writes.
+    """
+    settings = get_settings()
+    if settings.testing:
+        return get_database_instance()
+    return PooledDatabase(
+        f"sqlite+aiosqlite:///file:{settings.sqlite_db_path}?mode=ro",
+        uri=True,
+        factory=TunedConnection,
+        pool_size=settings.async_pool_size
+    )
 
 
 async def init_db():
@@ -29,99 +143,33 @@ async def init_db():
     Initializes the database and creates tables if they don't exist.
     This is intended to be called once on application startup.
     Uses async operations for non-blocking initialization.
-    Note: The database connection should already be established before calling this.
+    Note: The database connection should already be established before calling this,
+    and WAL mode is enabled separately via database.ensure_wal().
     """
+    settings = get_settings()
     logger.info(f"Initializing async database at {settings.sqlite_db_path}...")
     
     # Ensure directory exists
     db_path = Path(settings.sqlite_db_path)
     db_path.parent.mkdir(parents=True, exist_ok=True)
     
+    database = get_database_instance()
     try:
-        # Enable WAL mode for better concurrent access
-        result = await database.fetch_one("PRAGMA journal_mode=WAL")
-        logger.info(f"SQLite journal mode set to: {result[0] if result else 'unknown'}")
-        
-        # Set busy timeout to 30 seconds to handle concurrent access
-        await database.execute("PRAGMA busy_timeout=30000")
-        logger.info("SQLite busy timeout set to 30 seconds")
-        
-        # Enable foreign key constraints
-        await database.execute("PRAGMA foreign_keys = ON")
-        
-        # Create documents table with all required fields including audit columns
-        await database.execute("""
-        CREATE TABLE IF NOT EXISTS documents (
-            id TEXT PRIMARY KEY,
-            type TEXT NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            source_url TEXT,
-            status TEXT NOT NULL DEFAULT 'pending',
-            processing_error TEXT,
-            retry_count INTEGER NOT NULL DEFAULT 0,
-            max_retries INTEGER NOT NULL DEFAULT 3,
-            next_attempt_at TEXT,
-            last_error TEXT,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            CHECK (status IN ('pending', 'processing', 'completed', 'failed'))
-        )
-        """)
-        
-        # Create indexes for frequently queried fields
-        await database.execute("""
-        CREATE INDEX IF NOT EXISTS idx_documents_status 
-        ON documents(status)
-        """)
-        
-        await database.execute("""
-        CREATE INDEX IF NOT EXISTS idx_documents_type 
-        ON documents(type)
-        """)
-        
-        await database.execute("""
-        CREATE INDEX IF NOT EXISTS idx_documents_created_at 
-        ON documents(created_at)
-        """)
-        
-        # Create document_links table for many-to-many relationships
-        await database.execute("""
-        CREATE TABLE IF NOT EXISTS document_links (
-            source_doc_id TEXT NOT NULL,
-            target_doc_id TEXT NOT NULL,
-            PRIMARY KEY (source_doc_id, target_doc_id),
-            FOREIGN KEY (source_doc_id) REFERENCES documents(id) ON DELETE CASCADE,
-            FOREIGN KEY (target_doc_id) REFERENCES documents(id) ON DELETE CASCADE
-        )
-        """)
-        
-        # Create indexes for document_links
-        await database.execute("""
-        CREATE INDEX IF NOT EXISTS idx_document_links_source 
-        ON document_links(source_doc_id)
-        """)
-        
-        await database.execute("""
-        CREATE INDEX IF NOT EXISTS idx_document_links_target 
-        ON document_links(target_doc_id)
-        """)
-        
-        # Create document_tags table for storing tags
-        await database.execute("""
-        CREATE TABLE IF NOT EXISTS document_tags (
-            document_id TEXT NOT NULL,
-            tag TEXT NOT NULL,
-            PRIMARY KEY (document_id, tag),
-            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
-        )
-        """)
-        
-        # Create index for tag lookups
-        await database.execute("""
-        CREATE INDEX IF NOT EXISTS idx_document_tags_tag 
-        ON document_tags(tag)
-        """)
+        # Create the full schema in one immediate transaction on a single connection
+        async with database.connection() as connection:
+            raw_connection = connection.raw_connection
+            if raw_connection.in_transaction:
+                # Inside the force_rollback transaction (tests): executescript would
+                # commit it, so run the statements individually within it instead
+                statement = ""
+                for line in SCHEMA_SQL.splitlines(keepends=True):
+                    statement += line
+                    # complete_statement ignores semicolons inside comments and literals
+                    if sqlite3.complete_statement(statement):
+                        await connection.execute(statement)
+                        statement = ""
+            else:
+                await raw_connection.executescript(f"BEGIN IMMEDIATE;{SCHEMA_SQL}COMMIT;")
         
         logger.info("Async database initialized successfully.")
         
@@ -130,11 +178,96 @@ async def init_db():
         raise
 
 
+async def optimize() -> None:
+    """Run PRAGMA optimize on the write pool to refresh planner statistics."""
+    await get_database_instance().execute("PRAGMA optimize")
+
+
+async def wal_checkpoint() -> tuple:
+    """
+    Checkpoint the WAL back into the database file and truncate it.
+    
+    Returns:
+        Tuple of (busy, log_frames, checkpointed_frames) as reported by SQLite
+    """
+    if get_settings().testing:
+        # The in-memory test database has no WAL, and a checkpoint inside the
+        # force_rollback transaction fails; report what SQLite returns for a
+        # database not in WAL mode
+        return (0, -1, -1)
+    row = await get_database_instance().fetch_one("PRAGMA wal_checkpoint(TRUNCATE)")
+    # Iterating a Record yields column names, so index the values
+    return (row[0], row[1], row[2])
+
+
+async def connect() -> None:
+    """Connect the write pool and, when separate, the read pool."""
+    write_db = get_database_instance()
+    read_db = get_read_database_instance()
+    await write_db.connect()
+    if read_db is not write_db:
+        await read_db.connect()
+
+
+async def disconnect() -> None:
+    """Disconnect the read pool and the write pool."""
+    write_db = get_database_instance()
+    read_db = get_read_database_instance()
+    if read_db is not write_db:
+        await read_db.disconnect()
+    await write_db.disconnect()
+
+
 @asynccontextmanager
 async def get_database() -> AsyncGenerator[Database, None]:
     """
     Async context manager for database access.
-    The global database instance manages its own connection pool,
+    The database instance manages its own connection pool,
     so we just yield it directly.
     """
-    yield database
\ No newline at end of file
+    yield get_database_instance()
+
+
+@asynccontextmanager
+async def get_read_db() -> AsyncGenerator[Database, None]:
+    """Async context manager yielding the read-only database pool."""
+    yield get_read_database_instance()
+
+
+@asynccontextmanager
+async def get_write_db() -> AsyncGenerator[Database, None]:
+    """Async context manager yielding the single-writer database pool."""
+    yield get_database_instance()
+
+
+@asynccontextmanager
+async def write_transaction(db: Optional[Database] = None) -> AsyncGenerator[Connection, None]:
+    """
+    Async context manager for a writing transaction on the write pool.
+    
+    Issues BEGIN IMMEDIATE so the write lock is taken upfront instead of
+    upgrading a deferred transaction mid-flight, which can fail with
+    SQLITE_BUSY without honouring busy_timeout. Queries issued through the
+    same Database inside the block reuse this task's connection.
+    
+    Args:
+        db: Database to write through (defaults to the write pool)
+    
+    Yields:
+        The connection holding the transaction
+    """
+    db = db or get_database_instance()
+    async with db.connection() as connection:
+        if connection.raw_connection.in_transaction:
+            # Already inside a transaction (e.g. force_rollback in tests): nest via savepoint
+            async with connection.transaction():
+                yield connection
+            return
+        
+        await connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            await connection.execute("ROLLBACK")
+            raise
+        await connection.execute("COMMIT")
@@ -5,20 +5,19 @@ This module contains dependency functions used by FastAPI's dependency
 injection system to provide properly configured instances to endpoints.
 """
 import sqlite3
-from typing import Union, TYPE_CHECKING
-from fastapi import Depends
+from typing import TYPE_CHECKING
+from fastapi import Depends, Request
 
-from database import get_db, get_db_connection
+from database import get_db
 from repositories import DocumentRepository
-from config import settings
+from config import get_settings
 
 # Type checking imports
 if TYPE_CHECKING:
     from repositories_async import DocumentRepositoryAsync
 
 # Import async dependencies when feature flag is enabled
-if settings.use_async_db:
-    from database_async import database
+if get_settings().use_async_db:
     from repositories_async import DocumentRepositoryAsync
     from dependencies_async import get_document_repository_async
 
@@ -37,19 +36,39 @@ def get_document_repository(db: sqlite3.Connection = Depends(get_db)) -> Documen
     return DocumentRepository(db)
 
 
-# Unified dependency that returns appropriate repository based on feature flag
-async def get_repository() -> Union[DocumentRepository, "DocumentRepositoryAsync"]:
-    """
-    Unified dependency that provides either sync or async repository
-    based on the use_async_db feature flag.
-    
-    Returns:
-        Either DocumentRepository or DocumentRepositoryAsync instance
-    """
-    if settings.use_async_db:
-        return DocumentRepositoryAsync(database)
-    else:
-        # For sync mode, we get a connection and return sync repository
-        # Note: This is a temporary solution during migration
-        conn = get_db_connection()
-        return DocumentRepository(conn)
\ No newline at end of file
+# Unified dependency that returns appropriate repository based on feature flag.
+# The flag is resolved once at import so get_repository is a single stable
+# module-level callable and the async mode never borrows an unused sync connection.
+if get_settings().use_async_db:
+    async def get_repository(request: Request) -> "DocumentRepositoryAsync":
+        """
+        Unified dependency providing the async repository.
+        
+        The repository holds no per-request state, so one instance is built
+        in the lifespan and shared by every request.
+        
+        Args:
+            request: The incoming request, used to reach app.state
+        
+        Returns:
+            The DocumentRepositoryAsync stored on app.state
+        """
+        return request.app.state.repository
+else:
+    async def get_repository(
+        db: sqlite3.Connection = Depends(get_db)
+    ) -> DocumentRepository:
+        """
+        Unified dependency providing the sync repository.
+        
+        The connection comes from the get_db dependency, so it follows the
+        same pooled lifecycle and FastAPI caches the repository per request.
+        
+        Args:
+            db: Database connection from get_db dependency
+        
+        Returns:
+            DocumentRepository instance
+        """
+        return DocumentRepository(db)
+
@@ -7,7 +7,7 @@ injection system when async database mode is enabled.
 from typing import AsyncGenerator
 from fastapi import Depends
 
-from database_async import database
+from database_async import get_read_db, get_write_db
 from repositories_async import DocumentRepositoryAsync
 
 
@@ -15,10 +15,11 @@ async def get_document_repository_async() -> AsyncGenerator[DocumentRepositoryAs
     """
     Async dependency function to provide a DocumentRepositoryAsync instance.
     
-    The database instance manages its own connection pool, so we just
-    yield a repository configured with it.
+    Both the write pool and the read-only pool are injected so the
+    repository can route each query by intent.
     
     Yields:
-        DocumentRepositoryAsync instance configured with the database
+        DocumentRepositoryAsync instance configured with both pools
     """
-    yield DocumentRepositoryAsync(database)
\ No newline at end of file
+    async with get_write_db() as write_db, get_read_db() as read_db:
+        yield DocumentRepositoryAsync(write_db, read_db)
\ No newline at end of file
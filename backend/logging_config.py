@@ -4,8 +4,48 @@ Logging configuration for structured JSON output.
 import logging
 import json
 import sys
-from datetime import datetime
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder when orjson is unavailable
+    orjson = None
+
+from middleware import get_request_id
+
+# Standard LogRecord attributes that are not emitted as extra fields
+_RESERVED = frozenset({
+    "name", "msg", "args", "created", "filename",
+    "funcName", "levelname", "levelno", "lineno",
+    "module", "msecs", "pathname", "process",
+    "processName", "relativeCreated", "thread",
+    "threadName", "exc_info", "exc_text", "stack_info",
+})
+
+# Second-resolution ISO prefix of the last formatted record, reused while
+# records keep arriving within the same second. Stored as one tuple so a
+# concurrent swap never pairs a second with another second's prefix.
+_last_sec: Tuple[int, str] = (-1, "")
+
+
+def _format_timestamp(created: float) -> str:
+    """Format an epoch timestamp as ISO 8601 UTC with millisecond precision."""
+    global _last_sec
+    sec = int(created)
+    cached_sec, prefix = _last_sec
+    if sec != cached_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _last_sec = (sec, prefix)
+    return f"{prefix}.{int((created - sec) * 1000):03d}Z"
+
+
+if orjson is not None:
+    def _dumps(data: Dict[str, Any]) -> str:
+        return orjson.dumps(data, default=str).decode()
+else:
+    def _dumps(data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=str)
 
 
 class JSONFormatter(logging.Formatter):
@@ -13,11 +53,8 @@ class JSONFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         """Format log record as JSON."""
-        # Import here to avoid circular imports
-        from middleware import get_request_id
-        
         log_data: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _format_timestamp(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -36,15 +73,11 @@ class JSONFormatter(logging.Formatter):
             log_data["exception"] = self.formatException(record.exc_info)
             
         # Add any extra fields
-        for key, value in record.__dict__.items():
-            if key not in ("name", "msg", "args", "created", "filename", 
-                          "funcName", "levelname", "levelno", "lineno", 
-                          "module", "msecs", "pathname", "process", 
-                          "processName", "relativeCreated", "thread", 
-                          "threadName", "exc_info", "exc_text", "stack_info"):
-                log_data[key] = value
+        log_data.update({
+            key: value for key, value in record.__dict__.items() if key not in _RESERVED
+        })
                 
-        return json.dumps(log_data, default=str)
+        return _dumps(log_data)
 
 
 def setup_logging(log_level: str = "INFO") -> None:
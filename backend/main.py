@@ -1,7 +1,9 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import StreamingResponse
+import httpx
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 import time
 import asyncio
@@ -10,32 +12,100 @@ import database
 import schemas
 from dependencies import get_document_repository, get_repository
 from repositories import DocumentRepository
-from config import settings
+from config import get_settings
 from logging_config import setup_logging
-from auth import get_api_key
-from pipelines import get_indexing_pipeline, get_querying_pipeline
+from auth import require_api_key
+from pipelines import close_ollama_http, get_chroma_client, get_indexing_pipeline, get_querying_pipeline
 from middleware import RequestIDMiddleware
-from tasks import process_document_background, retry_failed_documents_task
+from tasks import (
+    process_documents_batch, retry_failed_documents_task, seconds_until_next_retry,
+    shutdown_indexing_executor, task_repository, wait_for_retry_wakeup, watch_processing
+)
 
 # Import async database module when feature flag is enabled
-if settings.use_async_db:
+if get_settings().use_async_db:
     import database_async
+    from repositories_async import DocumentRepositoryAsync
 
 # Configure logging
-setup_logging(settings.log_level)
+setup_logging(get_settings().log_level)
 logger = logging.getLogger(__name__)
 
 
 async def run_retry_loop():
     """
-    Background loop that periodically retries failed documents.
+    Background loop that retries failed documents.
+    Sleeps until the earliest failed document is due, at most 15 minutes;
+    a new failure wakes it early so the wait is recomputed with that
+    document's backoff.
     """
     while True:
-        await asyncio.sleep(900)  # Sleep for 15 minutes
+        try:
+            timeout = await seconds_until_next_retry(900)
+        except Exception as e:
+            logger.error("Error scheduling retry loop: %s", e, exc_info=True)
+            timeout = 900
+        await wait_for_retry_wakeup(timeout)
         try:
             await retry_failed_documents_task()
         except Exception as e:
-            logger.error(f"Error in retry loop: {e}", exc_info=True)
+            logger.error("Error in retry loop: %s", e, exc_info=True)
+
+
+async def run_ingest_worker(queue: "asyncio.Queue[str]"):
+    """
+    Long-lived worker that processes queued documents in batches.
+    After taking a document it keeps collecting for up to the batch window,
+    so a burst of uploads is indexed in one pipeline run. A fixed number of
+    these bounds concurrent embedding calls to Ollama.
+    """
+    settings = get_settings()
+    loop = asyncio.get_running_loop()
+    while True:
+        doc_ids = [await queue.get()]
+        deadline = loop.time() + settings.ingest_batch_window
+        while len(doc_ids) < settings.ingest_batch_size:
+            if not queue.empty():
+                doc_ids.append(queue.get_nowait())
+                continue
+            try:
+                doc_ids.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+        # Draining a non-empty queue never suspends, so yield once per batch
+        # (never per document) to let the other workers and requests run
+        await asyncio.sleep(0)
+        try:
+            await process_documents_batch(doc_ids)
+        except Exception as e:
+            logger.error("Error in ingest worker for documents %s: %s", doc_ids, e, exc_info=True)
+        finally:
+            for _ in doc_ids:
+                queue.task_done()
+
+
+async def requeue_documents(queue: "asyncio.Queue[str]", doc_ids: List[str]):
+    """
+    Queue documents a previous run accepted but never finished.
+    Runs as a task so a backlog larger than the queue does not hold up startup.
+    """
+    for doc_id in doc_ids:
+        await queue.put(doc_id)
+
+
+async def run_optimize_loop():
+    """
+    Background loop that periodically refreshes SQLite planner statistics.
+    """
+    while True:
+        await asyncio.sleep(600)  # Sleep for 10 minutes
+        try:
+            if get_settings().use_async_db:
+                await database_async.optimize()
+            else:
+                await asyncio.to_thread(database.optimize)
+        except Exception as e:
+            logger.error("Error in optimize loop: %s", e, exc_info=True)
 
 
 @asynccontextmanager
@@ -44,23 +114,69 @@ async def lifespan(app: FastAPI):
     Manage application lifespan events.
     Initialize database on startup.
     """
+    settings = get_settings()
     # Startup
     logger.info(f"Starting {settings.app_name}...")
     logger.info(f"Async database mode: {'ENABLED' if settings.use_async_db else 'DISABLED'}")
     
+    # WAL is persistent per database file, so enable it once per process start
+    database.ensure_wal()
+    
     if settings.use_async_db:
         # Async database initialization
-        await database_async.database.connect()
+        await database_async.connect()
         await database_async.init_db()
+        # One shared repository for all requests; it only holds the pools
+        app.state.repository = DocumentRepositoryAsync(
+            database_async.get_database_instance(),
+            database_async.get_read_database_instance()
+        )
         logger.info("Async database with connection pool initialized.")
     else:
         # Sync database initialization (existing)
         database.init_db()
     
+    # Warm both pipelines in parallel so Chroma connects and model setup overlap;
+    # failures are logged and the pipelines are built lazily on first use instead
+    try:
+        logger.info("Pre-initializing pipelines...")
+        await asyncio.gather(
+            asyncio.to_thread(get_indexing_pipeline),
+            asyncio.to_thread(get_querying_pipeline)
+        )
+        logger.info("Pipelines initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize pipelines: {e}")
+    
+    # Shared outbound HTTP client, reused across requests
+    app.state.http = httpx.AsyncClient(
+        timeout=2.0,
+        limits=httpx.Limits(max_keepalive_connections=10)
+    )
+    
+    # Start the document processing workers
+    app.state.ingest_queue = asyncio.Queue(maxsize=settings.ingest_queue_size)
+    ingest_workers = [
+        asyncio.create_task(run_ingest_worker(app.state.ingest_queue))
+        for _ in range(settings.ingest_workers)
+    ]
+    logger.info(f"Started {settings.ingest_workers} ingest workers.")
+    
+    # The queue is in memory, so documents still queued at the last shutdown,
+    # or cut off mid-run, are picked up again here; done before serving
+    # requests so no new document is queued twice
+    unfinished = await task_repository().recover_unfinished()
+    if unfinished:
+        logger.info("Re-queueing %d unfinished documents.", len(unfinished))
+    requeue_task = asyncio.create_task(requeue_documents(app.state.ingest_queue, unfinished))
+    
     # Start the retry loop
     retry_task = asyncio.create_task(run_retry_loop())
     logger.info("Document retry loop started.")
     
+    # Start the periodic PRAGMA optimize loop
+    optimize_task = asyncio.create_task(run_optimize_loop())
+    
     logger.info("Application startup complete.")
     
     yield
@@ -75,14 +191,39 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         logger.info("Retry loop cancelled.")
     
+    # Cancel optimize loop
+    optimize_task.cancel()
+    try:
+        await optimize_task
+    except asyncio.CancelledError:
+        logger.info("Optimize loop cancelled.")
+    
+    requeue_task.cancel()
+    await asyncio.gather(requeue_task, return_exceptions=True)
+    
+    # Give queued documents a chance to finish, then stop the workers.
+    # Anything left stays 'pending' and is re-queued on the next start.
+    try:
+        await asyncio.wait_for(app.state.ingest_queue.join(), timeout=30)
+    except asyncio.TimeoutError:
+        logger.warning(f"{app.state.ingest_queue.qsize()} queued documents left unprocessed at shutdown.")
+    for worker in ingest_workers:
+        worker.cancel()
+    await asyncio.gather(*ingest_workers, return_exceptions=True)
+    logger.info("Ingest workers stopped.")
+    shutdown_indexing_executor()
+    
+    await app.state.http.aclose()
+    await close_ollama_http()
+    
     if settings.use_async_db:
-        await database_async.database.disconnect()
+        await database_async.disconnect()
         logger.info("Async database connections closed.")
 
 
 # Create FastAPI app
 app = FastAPI(
-    title=settings.app_name,
+    title=get_settings().app_name,
     lifespan=lifespan
 )
 
@@ -104,99 +245,153 @@ app.add_middleware(
 )
 
 
-@app.get("/health")
-async def health_check():
-    """
-    Health check endpoint with comprehensive dependency status.
-    Returns the health status of the application and its dependencies.
-    """
-    health_status = {
-        "status": "healthy",
-        "app_name": settings.app_name,
-        "environment": settings.environment,
-        "version": "1.0.0-mvp",
-        "dependencies": {}
-    }
-    
-    # Check SQLite
+# Cached health probe results keyed by dependency name: (expires_at, (status, impact))
+_health_cache: Dict[str, Tuple[float, Tuple[Dict[str, Any], Optional[str]]]] = {}
+_health_locks: Dict[str, asyncio.Lock] = {}
+
+# How long a probe result is reused, by outcome
+HEALTHY_TTL_SECONDS = 5.0
+UNHEALTHY_TTL_SECONDS = 1.0
+
+
+def _count_documents_sync() -> int:
+    """Count documents over a short-lived sync connection."""
+    conn = database.get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def _check_sqlite() -> Tuple[Dict[str, Any], Optional[str]]:
+    """Probe SQLite; a failure makes the service unhealthy."""
+    settings = get_settings()
     try:
         if settings.use_async_db:
             # Async database check
-            import database_async
-            result = await database_async.database.fetch_one("SELECT COUNT(*) as count FROM documents")
+            result = await database_async.get_read_database_instance().fetch_one("SELECT COUNT(*) as count FROM documents")
             doc_count = result["count"] if result else 0
         else:
-            # Sync database check
-            conn = database.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM documents")
-            doc_count = cursor.fetchone()[0]
-            conn.close()
+            # Sync database check, off the event loop
+            doc_count = await asyncio.to_thread(_count_documents_sync)
             
-        health_status["dependencies"]["sqlite"] = {
+        return {
             "status": "healthy",
             "documents": doc_count,
             "path": settings.sqlite_db_path,
             "mode": "async" if settings.use_async_db else "sync"
-        }
+        }, None
     except Exception as e:
-        health_status["dependencies"]["sqlite"] = {
+        return {
             "status": "unhealthy",
             "error": str(e)[:100]
-        }
-        health_status["status"] = "unhealthy"  # Critical dependency
-    
-    # Check Ollama
+        }, "unhealthy"  # Critical dependency
+
+
+async def _check_ollama() -> Tuple[Dict[str, Any], Optional[str]]:
+    """Probe Ollama; a failure degrades the service."""
+    settings = get_settings()
     try:
-        import httpx
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.ollama_base_url}/api/tags",
-                timeout=2.0
-            )
-            if response.status_code == 200:
-                health_status["dependencies"]["ollama"] = {
-                    "status": "healthy",
-                    "url": settings.ollama_base_url,
-                    "models": {
-                        "generative": settings.generative_model,
-                        "embedding": settings.embedding_model
-                    }
-                }
-            else:
-                health_status["dependencies"]["ollama"] = {
-                    "status": "unhealthy",
-                    "error": f"HTTP {response.status_code}"
+        # Shared client from lifespan keeps the keep-alive connection warm
+        response = await app.state.http.get(f"{settings.ollama_base_url}/api/tags")
+        if response.status_code == 200:
+            return {
+                "status": "healthy",
+                "url": settings.ollama_base_url,
+                "models": {
+                    "generative": settings.generative_model,
+                    "embedding": settings.embedding_model
                 }
-                health_status["status"] = "degraded"
+            }, None
+        return {
+            "status": "unhealthy",
+            "error": f"HTTP {response.status_code}"
+        }, "degraded"
     except Exception as e:
-        health_status["dependencies"]["ollama"] = {
+        return {
             "status": "unhealthy",
             "error": str(e)[:100]
-        }
-        health_status["status"] = "degraded"
-    
-    # Check ChromaDB
+        }, "degraded"
+
+
+async def _check_chromadb() -> Tuple[Dict[str, Any], Optional[str]]:
+    """Probe ChromaDB; a failure degrades the service."""
+    settings = get_settings()
     try:
-        import chromadb
-        chroma_client = chromadb.HttpClient(
-            host=settings.chroma_host,
-            port=settings.chroma_port
-        )
-        # Try heartbeat as a health check
-        chroma_client.heartbeat()
-        health_status["dependencies"]["chromadb"] = {
+        # The chromadb client is blocking, so heartbeat from a worker thread
+        await asyncio.to_thread(lambda: get_chroma_client().heartbeat())
+        return {
             "status": "healthy",
             "host": f"{settings.chroma_host}:{settings.chroma_port}",
             "collection": settings.chroma_collection_name
-        }
+        }, None
     except Exception as e:
-        health_status["dependencies"]["chromadb"] = {
+        return {
             "status": "unhealthy",
             "error": str(e)[:100],
             "note": "System will degrade gracefully"
-        }
-        health_status["status"] = "degraded"
+        }, "degraded"
+
+
+async def _cached_check(name: str, check) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Run a health probe through the TTL cache.
+    Concurrent callers for the same dependency wait on one probe instead of
+    each issuing their own.
+    """
+    cached = _health_cache.get(name)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    lock = _health_locks.setdefault(name, asyncio.Lock())
+    async with lock:
+        # Another caller may have refreshed the entry while we waited
+        cached = _health_cache.get(name)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        result = await check()
+        ttl = UNHEALTHY_TTL_SECONDS if result[1] else HEALTHY_TTL_SECONDS
+        _health_cache[name] = (time.monotonic() + ttl, result)
+        return result
+
+
+@app.get("/health")
+async def health_check():
+    """
+    Health check endpoint with comprehensive dependency status.
+    Returns the health status of the application and its dependencies.
+    """
+    settings = get_settings()
+    health_status = {
+        "status": "healthy",
+        "app_name": settings.app_name,
+        "environment": settings.environment,
+        "version": "1.0.0-mvp",
+        "dependencies": {}
+    }
+    
+    # Probe all dependencies concurrently, reusing recent results
+    names = ("sqlite", "ollama", "chromadb")
+    results = await asyncio.gather(
+        _cached_check("sqlite", _check_sqlite),
+        _cached_check("ollama", _check_ollama),
+        _cached_check("chromadb", _check_chromadb),
+        return_exceptions=True
+    )
+    
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            # A probe that raised is reported as down; sqlite is critical
+            result = (
+                {"status": "unhealthy", "error": str(result)[:100]},
+                "unhealthy" if name == "sqlite" else "degraded"
+            )
+        dependency_status, impact = result
+        health_status["dependencies"][name] = dependency_status
+        # A critical failure is never downgraded by a lesser one
+        if impact == "unhealthy" or (impact == "degraded" and health_status["status"] == "healthy"):
+            health_status["status"] = impact
     
     # Overall health assessment
     if health_status["status"] == "degraded":
@@ -209,31 +404,38 @@ async def health_check():
     return health_status
 
 
+def _create_document_sync(doc_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a document on the single writer connection, released on return."""
+    with database.write_connection() as conn:
+        return DocumentRepository(conn).create(doc_dict)
+
+
 @app.post("/api/documents", 
          response_model=schemas.IngestionResponse,
          status_code=status.HTTP_202_ACCEPTED,
-         dependencies=[Depends(get_api_key)])
+         dependencies=[require_api_key])
 async def create_document(
     doc_create: schemas.DocumentCreate,
-    background_tasks: BackgroundTasks,
-    repo = Depends(get_repository)
+    request: Request
 ):
     """
     Create a new document and queue it for processing.
     Returns 202 Accepted with the document ID.
     """
+    settings = get_settings()
     try:
         # Create document in database
         doc_dict = doc_create.model_dump()
         
-        # Check if repository is async and await if needed
         if settings.use_async_db:
-            created_doc = await repo.create(doc_dict)
+            created_doc = await request.app.state.repository.create(doc_dict)
         else:
-            created_doc = repo.create(doc_dict)
+            # The writer is released once the insert commits, so a full
+            # queue below never holds it and blocks other writes
+            created_doc = await asyncio.to_thread(_create_document_sync, doc_dict)
         
-        # Queue background processing
-        background_tasks.add_task(process_document_background, created_doc["id"])
+        # Queue for the ingest workers; waits here if the queue is full
+        await request.app.state.ingest_queue.put(created_doc["id"])
         
         return schemas.IngestionResponse(
             message="Document accepted for processing",
@@ -241,7 +443,7 @@ async def create_document(
             status=schemas.DocumentStatus.PENDING
         )
     except Exception as e:
-        logger.error(f"Error creating document: {e}", exc_info=True)
+        logger.error("Error creating document: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create document"
@@ -250,7 +452,7 @@ async def create_document(
 
 @app.get("/api/documents",
          response_model=schemas.DocumentListResponse,
-         dependencies=[Depends(get_api_key)])
+         dependencies=[require_api_key])
 async def get_documents(
     limit: int = 20,
     offset: int = 0,
@@ -259,6 +461,7 @@ async def get_documents(
     """
     Get paginated list of documents.
     """
+    settings = get_settings()
     if limit > 100:
         limit = 100  # Cap maximum limit
         
@@ -268,24 +471,8 @@ async def get_documents(
     else:
         documents, total = repo.get_all(limit=limit, offset=offset)
     
-    # Convert to response models
-    doc_responses = []
-    for doc in documents:
-        doc_response = schemas.DocumentResponse(
-            id=doc["id"],
-            type=doc["type"],
-            title=doc["title"],
-            content=doc["content"],
-            source_url=doc["source_url"],
-            status=doc["status"],
-            processing_error=doc["processing_error"],
-            retry_count=doc["retry_count"],
-            created_at=doc["created_at"],
-            updated_at=doc["updated_at"],
-            tags=doc["tags"],
-            linked_document_ids=doc["linked_document_ids"]
-        )
-        doc_responses.append(doc_response)
+    # Validate the repository records directly; unknown columns are ignored
+    doc_responses = [schemas.DocumentResponse.model_validate(doc) for doc in documents]
     
     page = (offset // limit) + 1
     
@@ -299,19 +486,24 @@ async def get_documents(
 
 @app.get("/api/documents/{doc_id}",
          response_model=schemas.DocumentResponse,
-         dependencies=[Depends(get_api_key)])
+         dependencies=[require_api_key])
 async def get_document(
     doc_id: str,
-    repo = Depends(get_repository)
+    repo = Depends(get_repository),
+    cache_control: Optional[str] = Header(None)
 ):
     """
     Get a specific document by ID.
+    Served from a short-lived cache; send "Cache-Control: no-cache" to read
+    straight from the database.
     """
+    settings = get_settings()
+    use_cache = "no-cache" not in (cache_control or "")
     # Check if repository is async and await if needed
     if settings.use_async_db:
-        doc = await repo.get_by_id(doc_id)
+        doc = await repo.get_by_id(doc_id, use_cache=use_cache)
     else:
-        doc = repo.get_by_id(doc_id)
+        doc = repo.get_by_id(doc_id, use_cache=use_cache)
     
     if not doc:
         raise HTTPException(
@@ -319,25 +511,115 @@ async def get_document(
             detail=f"Document {doc_id} not found"
         )
     
-    return schemas.DocumentResponse(
-        id=doc["id"],
-        type=doc["type"],
-        title=doc["title"],
-        content=doc["content"],
-        source_url=doc["source_url"],
-        status=doc["status"],
-        processing_error=doc["processing_error"],
-        retry_count=doc["retry_count"],
-        created_at=doc["created_at"],
-        updated_at=doc["updated_at"],
-        tags=doc["tags"],
-        linked_document_ids=doc["linked_document_ids"]
+    return schemas.DocumentResponse.model_validate(doc)
+
+
+@app.get("/api/documents/{doc_id}/wait",
+         response_model=schemas.DocumentResponse,
+         dependencies=[require_api_key])
+async def wait_for_document(
+    doc_id: str,
+    timeout: float = Query(default=30, ge=0, le=60)
+):
+    """
+    Get a document once it has finished processing.
+    Blocks until the document is completed or failed, or for at most
+    timeout seconds, then returns it in its current state. Replaces
+    polling GET /api/documents/{doc_id}; the finish is signalled in-process,
+    so it is only seen by the worker process that ran the pipeline.
+    
+    Reads go through the background-task repository rather than a request
+    dependency, so no pooled connection is held during the wait and sync
+    mode reads run off the event loop.
+    """
+    repo = task_repository()
+    with watch_processing(doc_id) as finished:
+        doc = await repo.get_by_id(doc_id)
+        if not doc:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Document {doc_id} not found"
+            )
+        
+        if doc["status"] not in ("completed", "failed"):
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            doc = await repo.get_by_id(doc_id)
+    
+    return schemas.DocumentResponse.model_validate(doc)
+
+
+@app.get("/api/documents/{doc_id}/content",
+         response_class=StreamingResponse,
+         dependencies=[require_api_key])
+async def get_document_content(doc_id: str, request: Request):
+    """
+    Stream the raw content of a document as plain text.
+    
+    In sync mode the pooled connection is held by the response body rather
+    than a dependency, so it stays open until the last chunk has been sent.
+    In async mode the chunks are read through the shared async pools; a sync
+    connection must not be opened there, since in test mode it would contend
+    with the open force_rollback transaction on the shared database.
+    """
+    if get_settings().use_async_db:
+        chunks = await request.app.state.repository.iter_content(doc_id)
+        if chunks is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Document {doc_id} not found"
+            )
+        return StreamingResponse(chunks, media_type="text/plain; charset=utf-8")
+    
+    pooled = database.get_db()
+    conn = next(pooled)
+    try:
+        chunks = DocumentRepository(conn).iter_content(doc_id)
+    except BaseException:
+        pooled.close()
+        raise
+    
+    if chunks is None:
+        pooled.close()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document {doc_id} not found"
+        )
+    
+    def body():
+        try:
+            yield from chunks
+        finally:
+            pooled.close()
+    
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/api/admin/wal-checkpoint",
+         response_model=schemas.WalCheckpointResponse,
+         dependencies=[require_api_key])
+async def wal_checkpoint():
+    """
+    Checkpoint and truncate the SQLite WAL file on demand.
+    Runs on the async write pool in async mode, for the same reason as
+    get_document_content.
+    """
+    if get_settings().use_async_db:
+        busy, log_frames, checkpointed_frames = await database_async.wal_checkpoint()
+    else:
+        busy, log_frames, checkpointed_frames = await asyncio.to_thread(database.wal_checkpoint)
+    return schemas.WalCheckpointResponse(
+        busy=bool(busy),
+        log_frames=log_frames,
+        checkpointed_frames=checkpointed_frames
     )
 
 
 @app.post("/api/chat",
          response_model=schemas.ChatResponse,
-         dependencies=[Depends(get_api_key)])
+         dependencies=[require_api_key])
 async def chat(
     chat_request: schemas.ChatRequest
 ):
@@ -351,14 +633,19 @@ async def chat(
         # Get the querying pipeline
         querying_pipeline = get_querying_pipeline()
         
-        logger.info(f"Processing chat query: '{chat_request.query[:100]}...'")
+        logger.info("Processing chat query: '%.100s...'", chat_request.query)
+        
+        # Only fetch a few candidates per context slot; the score filter
+        # discards most of anything beyond that
+        top_k = max(chat_request.context_limit * 3, 15)
         
         # Run the pipeline with the user's query and context limit
-        result = querying_pipeline.run({
+        result = await querying_pipeline.run_async({
             "query_embedder": {"text": chat_request.query},
-            "doc_limiter": {"limit": chat_request.context_limit},
+            "retriever": {"top_k": top_k},
+            "doc_filter": {"limit": chat_request.context_limit},
             "prompt_builder": {"query": chat_request.query}
-        })
+        }, include_outputs_from={"doc_filter"})
         
         # Extract the generated answer
         if not result or "generator" not in result:
@@ -370,28 +657,26 @@ async def chat(
         
         answer = generator_result["replies"][0]
         
-        # Extract source documents if available
-        sources = []
-        if "retriever" in result and "documents" in result["retriever"]:
-            retrieved_docs = result["retriever"]["documents"]
-            
-            # Check if we have any documents
-            if not retrieved_docs:
-                logger.warning("No documents retrieved for query - possible empty knowledge base or no matches")
-            
-            for doc in retrieved_docs[:chat_request.context_limit]:
-                source_info = {
-                    "content": doc.content[:200] + "..." if len(doc.content) > 200 else doc.content,
-                    "title": doc.meta.get("title", "Untitled"),
-                    "doc_id": doc.meta.get("doc_id"),
-                    "type": doc.meta.get("type")
-                }
-                sources.append(source_info)
+        # Sources are the documents that reached the prompt; doc_filter already
+        # applied the context limit, so no further slicing is needed
+        context_docs = result.get("doc_filter", {}).get("documents", [])
+        if not context_docs:
+            logger.warning("No documents retrieved for query - possible empty knowledge base or no matches")
+        
+        sources = [
+            {
+                "content": content[:200] + "..." if len(content := doc.content or "") > 200 else content,
+                "title": doc.meta.get("title", "Untitled"),
+                "doc_id": doc.meta.get("doc_id"),
+                "type": doc.meta.get("type")
+            }
+            for doc in context_docs
+        ]
         
         # Calculate query time
         query_time_ms = int((time.time() - start_time) * 1000)
         
-        logger.info(f"Chat query processed successfully in {query_time_ms}ms")
+        logger.info("Chat query processed successfully in %dms", query_time_ms)
         
         return schemas.ChatResponse(
             answer=answer,
@@ -400,7 +685,7 @@ async def chat(
         )
         
     except Exception as e:
-        logger.error(f"Error processing chat query: {e}", exc_info=True)
+        logger.error("Error processing chat query: %s", e, exc_info=True)
         
         # Check if it's a ChromaDB connection issue
         if "ChromaDB" in str(e) or "connection" in str(e).lower():
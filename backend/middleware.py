@@ -1,7 +1,7 @@
 """
 Request middleware for the Synapse backend.
 """
-import uuid
+import secrets
 import time
 import logging
 from contextvars import ContextVar
@@ -14,6 +14,10 @@ logger = logging.getLogger(__name__)
 # Context variable to store request ID
 _request_id_ctx_var: ContextVar[str] = ContextVar('request_id', default=None)
 
+# Inbound X-Request-ID values longer than this are replaced rather than trusted
+MAX_REQUEST_ID_LENGTH = 128
+
+
 def get_request_id() -> str:
     """Get the current request ID from context."""
     return _request_id_ctx_var.get()
@@ -25,31 +29,37 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
     """
     
     async def dispatch(self, request: Request, call_next):
-        # Generate request ID
-        request_id = str(uuid.uuid4())
+        # Reuse an upstream request ID (e.g. from the ingress) so traces line up;
+        # otherwise generate a short random one
+        request_id = request.headers.get("x-request-id")
+        if not request_id or len(request_id) > MAX_REQUEST_ID_LENGTH:
+            request_id = secrets.token_hex(8)
         
         # Store in request state and context
         request.state.request_id = request_id
-        _request_id_ctx_var.set(request_id)
+        token = _request_id_ctx_var.set(request_id)
         
         # Log request
         start_time = time.time()
-        logger.info(f"[{request_id}] {request.method} {request.url.path}")
+        log_info = logger.isEnabledFor(logging.INFO)
+        if log_info:
+            logger.info("[%s] %s %s", request_id, request.method, request.url.path)
         
         try:
             # Process request
             response = await call_next(request)
             
             # Log response
-            process_time = time.time() - start_time
-            logger.info(
-                f"[{request_id}] Completed in {process_time:.3f}s with status {response.status_code}"
-            )
+            if log_info:
+                logger.info(
+                    "[%s] Completed in %.3fs with status %s",
+                    request_id, time.time() - start_time, response.status_code
+                )
             
             # Add request ID to response headers
             response.headers["X-Request-ID"] = request_id
             
             return response
         finally:
-            # Clear context
-            _request_id_ctx_var.set(None)
\ No newline at end of file
+            # Restore the context to what it was before this request
+            _request_id_ctx_var.reset(token)
@@ -2,43 +2,154 @@
 RAG Pipeline Implementation using Haystack v2.
 Provides indexing and querying pipelines for the Synapse system.
 """
+import os
 import uuid
+import asyncio
 import logging
+import threading
+from dataclasses import replace
+from itertools import islice
 from typing import List, Dict, Any, Optional
 
-from haystack import Pipeline, component, Document
+import httpx
+from haystack import AsyncPipeline, Pipeline, component, Document
 from haystack.components.writers import DocumentWriter
 from haystack.components.preprocessors import DocumentSplitter
 from haystack.components.embedders import SentenceTransformersTextEmbedder, SentenceTransformersDocumentEmbedder
-from haystack.components.builders import PromptBuilder
 from haystack.components.generators import HuggingFaceLocalGenerator
 from haystack.components.retrievers import InMemoryBM25Retriever
 from haystack_integrations.document_stores.chroma import ChromaDocumentStore
 from haystack_integrations.components.retrievers.chroma import ChromaEmbeddingRetriever
-from haystack_integrations.components.embedders.ollama import OllamaDocumentEmbedder, OllamaTextEmbedder
+from haystack_integrations.components.embedders.ollama import OllamaTextEmbedder
 from haystack_integrations.components.generators.ollama import OllamaGenerator
 
-from config import settings
-from retry_utils import ollama_retry, chromadb_retry
+from config import get_settings
+from retry_utils import ChromaDBConnectionError, ollama_retry, chromadb_retry
 
 logger = logging.getLogger(__name__)
 
 
+# Shared async HTTP client for direct Ollama calls; generation can take a while
+_ollama_http: Optional[httpx.AsyncClient] = None
+
+
+def get_ollama_http() -> httpx.AsyncClient:
+    """
+    Get or create the shared async HTTP client used by the run_async paths.
+    
+    Returns:
+        The httpx.AsyncClient instance
+    """
+    global _ollama_http
+    if _ollama_http is None:
+        _ollama_http = httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=5.0))
+    return _ollama_http
+
+
+async def close_ollama_http() -> None:
+    """Close the shared Ollama HTTP client if it was created."""
+    global _ollama_http
+    if _ollama_http is not None:
+        await _ollama_http.aclose()
+        _ollama_http = None
+
+
+async def _ollama_embed(url: str, model: str, texts: List[str]) -> List[List[float]]:
+    """Embed texts with one call to Ollama's /api/embed endpoint."""
+    response = await get_ollama_http().post(
+        f"{url}/api/embed",
+        json={"model": model, "input": texts}
+    )
+    response.raise_for_status()
+    return response.json()["embeddings"]
+
+
+# Chunks sent per /api/embed call, and how many such calls may be in flight
+EMBED_BATCH_SIZE = 32
+EMBED_CONCURRENCY = 4
+
+# Shared sync HTTP client for batched embedding from the threaded indexing pipeline
+_ollama_sync_http: Optional[httpx.Client] = None
+_ollama_sync_lock = threading.Lock()
+
+
+def get_ollama_sync_http() -> httpx.Client:
+    """
+    Get or create the shared sync HTTP client used by the indexing pipeline.
+    
+    Returns:
+        The httpx.Client instance
+    """
+    global _ollama_sync_http
+    if _ollama_sync_http is None:
+        with _ollama_sync_lock:
+            if _ollama_sync_http is None:
+                _ollama_sync_http = httpx.Client(timeout=httpx.Timeout(120.0, connect=5.0))
+    return _ollama_sync_http
+
+
+def _embed_batches(texts: List[str]) -> List[List[str]]:
+    """Split texts into EMBED_BATCH_SIZE-sized batches."""
+    return [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+
+
 @component 
 class RetryableOllamaDocumentEmbedder:
     """
-    Wrapper around OllamaDocumentEmbedder that adds retry logic.
+    Ollama document embedder with retry logic.
+    
+    Sends chunks to /api/embed in batches of EMBED_BATCH_SIZE rather than
+    one request per chunk.
     """
     def __init__(self, model: str, url: str):
-        self.embedder = OllamaDocumentEmbedder(model=model, url=url)
         self.model = model
         self.url = url
     
     @component.output_types(documents=List[Document])
     @ollama_retry
     def run(self, documents: List[Document]) -> Dict[str, Any]:
-        """Run the embedder with retry logic."""
-        return self.embedder.run(documents)
+        """Embed the documents in sequential batches with retry logic."""
+        embeddings: List[List[float]] = []
+        client = get_ollama_sync_http()
+        for batch in _embed_batches([doc.content or "" for doc in documents]):
+            response = client.post(
+                f"{self.url}/api/embed",
+                json={"model": self.model, "input": batch}
+            )
+            response.raise_for_status()
+            embeddings.extend(response.json()["embeddings"])
+        return {
+            "documents": [
+                replace(doc, embedding=embedding)
+                for doc, embedding in zip(documents, embeddings, strict=True)
+            ]
+        }
+    
+    @component.output_types(documents=List[Document])
+    @ollama_retry
+    async def run_async(self, documents: List[Document]) -> Dict[str, Any]:
+        """Embed the documents in concurrent batches over async HTTP with retry logic."""
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await _ollama_embed(self.url, self.model, batch)
+        
+        results = await asyncio.gather(
+            *(embed(batch) for batch in _embed_batches([doc.content or "" for doc in documents])),
+            return_exceptions=True
+        )
+        embeddings: List[List[float]] = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            embeddings.extend(result)
+        return {
+            "documents": [
+                replace(doc, embedding=embedding)
+                for doc, embedding in zip(documents, embeddings, strict=True)
+            ]
+        }
 
 
 @component
@@ -56,6 +167,13 @@ class RetryableOllamaTextEmbedder:
     def run(self, text: str) -> Dict[str, Any]:
         """Run the embedder with retry logic."""
         return self.embedder.run(text)
+    
+    @component.output_types(embedding=List[float])
+    @ollama_retry
+    async def run_async(self, text: str) -> Dict[str, Any]:
+        """Embed the text over async HTTP with retry logic."""
+        embeddings = await _ollama_embed(self.url, self.model, [text])
+        return {"embedding": embeddings[0]}
 
 
 @component
@@ -71,12 +189,31 @@ class RetryableOllamaGenerator:
         )
         self.model = model
         self.url = url
+        self.generation_kwargs = generation_kwargs or {}
     
     @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
     @ollama_retry
     def run(self, prompt: str) -> Dict[str, Any]:
         """Run the generator with retry logic."""
         return self.generator.run(prompt)
+    
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    @ollama_retry
+    async def run_async(self, prompt: str) -> Dict[str, Any]:
+        """Generate over async HTTP with retry logic."""
+        response = await get_ollama_http().post(
+            f"{self.url}/api/generate",
+            json={
+                "model": self.model,
+                "prompt": prompt,
+                "stream": False,
+                "options": self.generation_kwargs
+            }
+        )
+        response.raise_for_status()
+        body = response.json()
+        reply = body.pop("response", "")
+        return {"replies": [reply], "meta": [body]}
 
 
 @component
@@ -97,12 +234,15 @@ class CustomMetadataProcessor:
         Returns:
             Dictionary with processed documents
         """
+        # One urandom read for all chunk IDs instead of one per uuid4() call
+        raw = os.urandom(16 * len(documents))
+        
         for idx, doc in enumerate(documents):
             # Create a copy of existing metadata or initialize empty dict
             metadata = doc.meta.copy() if doc.meta else {}
             
-            # Add chunk-specific metadata
-            metadata["chunk_id"] = str(uuid.uuid4())
+            # Add chunk-specific metadata; version=4 sets the uuid4 version and variant bits
+            metadata["chunk_id"] = str(uuid.UUID(bytes=raw[idx * 16:(idx + 1) * 16], version=4))
             metadata["chunk_index"] = idx
             
             # Update document metadata
@@ -112,89 +252,91 @@ class CustomMetadataProcessor:
 
 
 @component
-class DocumentScoreFilter:
+class ScoreFilterAndLimiter:
     """
-    Custom Haystack component to filter documents based on similarity score.
-    Removes documents with low relevance scores to improve answer quality.
+    Custom Haystack component that filters documents by similarity score and
+    limits how many are passed to the LLM, in a single pass.
+    Removes low-relevance documents to improve answer quality and caps the
+    count so we don't exceed token limits.
     """
     
-    def __init__(self, min_score: float = 0.25, relative_margin: float = 0.25):
+    def __init__(self, min_score: float = 0.25, relative_margin: float = 0.25, default_limit: int = 5):
         """
-        Initialize the score filter.
+        Initialize the filter.
         
         Args:
             min_score: Absolute minimum similarity score (0-1 range)
             relative_margin: Keep docs within this margin of the best score
+            default_limit: Maximum number of documents when no limit is given
         """
         self.min_score = min_score
         self.relative_margin = relative_margin
+        self.default_limit = default_limit
     
     @component.output_types(documents=List[Document])
-    def run(self, documents: List[Document]) -> Dict[str, Any]:
+    def run(self, documents: List[Document], limit: Optional[int] = None) -> Dict[str, Any]:
         """
-        Filter documents based on similarity scores.
+        Keep the top documents that pass both score thresholds, up to the limit.
         
         Args:
-            documents: List of Document objects with scores
+            documents: List of Document objects with scores, best first
+            limit: Maximum number of documents to return (uses default_limit if not specified)
             
         Returns:
-            Dictionary with filtered documents
+            Dictionary with filtered and limited documents
         """
         if not documents:
             return {"documents": []}
         
-        # Get the best score (documents should be sorted by score already)
-        best_score = getattr(documents[0], 'score', 1.0)
-        relative_threshold = best_score - self.relative_margin
+        actual_limit = limit if limit is not None else self.default_limit
+        # Ensure limit is within valid range
+        actual_limit = max(1, min(actual_limit, 20))
         
-        filtered_docs = []
-        for doc in documents:
-            doc_score = getattr(doc, 'score', 0.0)
-            
-            # Apply both absolute and relative thresholds
-            if doc_score >= self.min_score and doc_score >= relative_threshold:
-                filtered_docs.append(doc)
-            else:
-                logger.debug(f"Filtered out document with score {doc_score:.3f} (best: {best_score:.3f})")
+        # Documents are sorted by score, so the first one sets the relative threshold
+        best_score = getattr(documents[0], "score", None)
+        best_score = 1.0 if best_score is None else best_score
+        threshold = max(self.min_score, best_score - self.relative_margin)
+        
+        kept = list(islice(
+            (doc for doc in documents if (doc.score or 0.0) >= threshold),
+            actual_limit
+        ))
         
-        logger.info(f"Score filter: kept {len(filtered_docs)} of {len(documents)} documents")
+        logger.info("Score filter: kept %d of %d documents (limit %d)", len(kept), len(documents), actual_limit)
         
-        return {"documents": filtered_docs}
+        return {"documents": kept}
 
 
 @component
-class DocumentLimiter:
+class ContextPromptBuilder:
     """
-    Custom Haystack component to limit the number of documents passed to the LLM.
-    This ensures we don't exceed token limits by controlling document count.
+    Custom Haystack component that builds the RAG prompt.
+    The template only interpolates the query and document contents, so it is
+    assembled with plain string joins instead of rendering Jinja per query.
     """
     
-    def __init__(self, default_limit: int = 5):
-        self.default_limit = default_limit
+    PREAMBLE = (
+        "\nYou are a helpful assistant with access to the user's knowledge base.\n"
+        "Use the following context to answer the user's question.\n"
+        "If you cannot answer based on the context, say so.\n"
+        "\n"
+        "Context:\n"
+    )
     
-    @component.output_types(documents=List[Document])
-    def run(self, documents: List[Document], limit: Optional[int] = None) -> Dict[str, Any]:
+    @component.output_types(prompt=str)
+    def run(self, documents: List[Document], query: str) -> Dict[str, Any]:
         """
-        Limit the number of documents passed through.
+        Build the prompt from the retrieved documents and the query.
         
         Args:
-            documents: List of Document objects to filter
-            limit: Maximum number of documents to return (uses default_limit if not specified)
+            documents: Context documents, in ranked order
+            query: The user's question
             
         Returns:
-            Dictionary with limited documents
+            Dictionary with the rendered prompt
         """
-        actual_limit = limit if limit is not None else self.default_limit
-        # Ensure limit is within valid range
-        actual_limit = max(1, min(actual_limit, 20))
-        
-        # Return only the top documents up to the limit
-        limited_docs = documents[:actual_limit] if documents else []
-        
-        if len(documents) > actual_limit:
-            logger.info(f"Limited documents from {len(documents)} to {actual_limit}")
-        
-        return {"documents": limited_docs}
+        context = "".join(f"\n---\n{doc.content}\n" for doc in documents)
+        return {"prompt": f"{self.PREAMBLE}{context}\n---\n\nQuestion: {query}\n\nAnswer:"}
 
 
 @chromadb_retry
@@ -206,13 +348,13 @@ def create_chroma_document_store() -> ChromaDocumentStore:
         Initialized ChromaDocumentStore instance
         
     Raises:
-        RuntimeError: If connection to ChromaDB fails after retries
+        ChromaDBConnectionError: If connection to ChromaDB fails after retries
     """
+    settings = get_settings()
     try:
         # Initialize document store
         # For chroma-haystack 0.15.0, we need to set the persist_path to None
         # and use environment variables for the connection
-        import os
         os.environ["CHROMA_SERVER_HOST"] = settings.chroma_host
         os.environ["CHROMA_SERVER_HTTP_PORT"] = str(settings.chroma_port)
         
@@ -235,7 +377,48 @@ def create_chroma_document_store() -> ChromaDocumentStore:
         
     except Exception as e:
         logger.error(f"Failed to initialize ChromaDocumentStore: {e}")
-        raise RuntimeError(f"ChromaDB connection failed: {e}")
+        raise ChromaDBConnectionError(f"ChromaDB connection failed: {e}") from e
+
+
+# Shared ChromaDB handles - lazily created once and reused by health checks and both pipelines
+_chroma_lock = threading.Lock()
+_chroma_client = None
+_chroma_store: Optional[ChromaDocumentStore] = None
+
+
+def get_chroma_client():
+    """
+    Get or create the shared ChromaDB HTTP client.
+    
+    Returns:
+        The chromadb.HttpClient instance
+    """
+    global _chroma_client
+    if _chroma_client is None:
+        with _chroma_lock:
+            if _chroma_client is None:
+                import chromadb
+                settings = get_settings()
+                _chroma_client = chromadb.HttpClient(
+                    host=settings.chroma_host,
+                    port=settings.chroma_port
+                )
+    return _chroma_client
+
+
+def get_chroma_store() -> ChromaDocumentStore:
+    """
+    Get or create the shared ChromaDocumentStore.
+    
+    Returns:
+        The document store used by both the indexing and querying pipelines
+    """
+    global _chroma_store
+    if _chroma_store is None:
+        with _chroma_lock:
+            if _chroma_store is None:
+                _chroma_store = create_chroma_document_store()
+    return _chroma_store
 
 
 def build_indexing_pipeline() -> Pipeline:
@@ -245,12 +428,13 @@ def build_indexing_pipeline() -> Pipeline:
     Pipeline flow:
     1. DocumentSplitter - splits documents into chunks
     2. CustomMetadataProcessor - adds chunk metadata
-    3. OllamaDocumentEmbedder - generates embeddings
+    3. RetryableOllamaDocumentEmbedder - generates embeddings in batches
     4. DocumentWriter - writes to ChromaDB
     
     Returns:
         Configured indexing pipeline
     """
+    settings = get_settings()
     # Initialize components
     splitter = DocumentSplitter(
         split_by=settings.chunk_split_by,
@@ -266,7 +450,7 @@ def build_indexing_pipeline() -> Pipeline:
         url=settings.ollama_base_url
     )
     
-    document_store = create_chroma_document_store()
+    document_store = get_chroma_store()
     writer = DocumentWriter(document_store=document_store)
     
     # Build pipeline
@@ -287,53 +471,40 @@ def build_indexing_pipeline() -> Pipeline:
     return pipeline
 
 
-def build_querying_pipeline() -> Pipeline:
+def build_querying_pipeline() -> AsyncPipeline:
     """
     Build the query/chat pipeline.
     
     Pipeline flow:
     1. OllamaTextEmbedder - embeds the query
     2. ChromaEmbeddingRetriever - retrieves relevant documents
-    3. PromptBuilder - builds prompt with context
+    3. ContextPromptBuilder - builds prompt with context
     4. OllamaGenerator - generates response
     
+    Built as an AsyncPipeline so the Ollama components run through their
+    run_async methods on the event loop; sync components run in the
+    default executor.
+    
     Returns:
         Configured querying pipeline
     """
+    settings = get_settings()
     # Initialize components
     query_embedder = RetryableOllamaTextEmbedder(
         model=settings.embedding_model,
         url=settings.ollama_base_url
     )
     
-    document_store = create_chroma_document_store()
+    document_store = get_chroma_store()
     retriever = ChromaEmbeddingRetriever(
         document_store=document_store,
-        top_k=50  # Increased from 10 to compensate for no reranking
+        top_k=15  # Default only; /api/chat sizes top_k from the context limit per query
     )
     
-    # Define the prompt template
-    prompt_template = """
-You are a helpful assistant with access to the user's knowledge base.
-Use the following context to answer the user's question.
-If you cannot answer based on the context, say so.
-
-Context:
-{% for doc in documents %}
----
-{{ doc.content }}
-{% endfor %}
----
-
-Question: {{ query }}
-
-Answer:"""
-    
-    prompt_builder = PromptBuilder(template=prompt_template)
+    prompt_builder = ContextPromptBuilder()
     
-    # Add score filter and document limiter
-    score_filter = DocumentScoreFilter(min_score=0.25, relative_margin=0.25)
-    doc_limiter = DocumentLimiter(default_limit=5)
+    # Fused score filter and document limiter
+    doc_filter = ScoreFilterAndLimiter(min_score=0.25, relative_margin=0.25, default_limit=5)
     
     generator = RetryableOllamaGenerator(
         model=settings.generative_model,
@@ -345,21 +516,19 @@ Answer:"""
     )
     
     # Build pipeline
-    pipeline = Pipeline()
+    pipeline = AsyncPipeline()
     
-    # Add components (with score filter and document limiter)
+    # Add components (with the fused score filter and limiter)
     pipeline.add_component("query_embedder", query_embedder)
     pipeline.add_component("retriever", retriever)
-    pipeline.add_component("score_filter", score_filter)
-    pipeline.add_component("doc_limiter", doc_limiter)
+    pipeline.add_component("doc_filter", doc_filter)
     pipeline.add_component("prompt_builder", prompt_builder)
     pipeline.add_component("generator", generator)
     
-    # Connect components (retriever → score_filter → doc_limiter → prompt_builder)
+    # Connect components (retriever → doc_filter → prompt_builder)
     pipeline.connect("query_embedder.embedding", "retriever.query_embedding")
-    pipeline.connect("retriever.documents", "score_filter.documents")
-    pipeline.connect("score_filter.documents", "doc_limiter.documents")
-    pipeline.connect("doc_limiter.documents", "prompt_builder.documents")
+    pipeline.connect("retriever.documents", "doc_filter.documents")
+    pipeline.connect("doc_filter.documents", "prompt_builder.documents")
     pipeline.connect("prompt_builder.prompt", "generator.prompt")
     
     logger.info("Querying pipeline built successfully")
@@ -384,7 +553,7 @@ def get_indexing_pipeline() -> Pipeline:
     return _indexing_pipeline
 
 
-def get_querying_pipeline() -> Pipeline:
+def get_querying_pipeline() -> AsyncPipeline:
     """
     Get or create the singleton querying pipeline.
     
@@ -396,15 +565,3 @@ def get_querying_pipeline() -> Pipeline:
         _querying_pipeline = build_querying_pipeline()
     return _querying_pipeline
 
-
-# Initialize pipelines on module import (optional)
-# This can help catch configuration errors early
-if settings.environment == "production":
-    try:
-        logger.info("Pre-initializing pipelines...")
-        get_indexing_pipeline()
-        get_querying_pipeline()
-        logger.info("Pipelines initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize pipelines: {e}")
-        # Don't raise - allow the app to start even if pipelines fail
\ No newline at end of file
@@ -5,15 +5,372 @@ This module contains repository classes that abstract data access logic,
 providing a clean separation between the API layer and database implementation.
 """
 import sqlite3
-from typing import List, Dict, Tuple, Optional
+from functools import lru_cache
+from operator import itemgetter
+from typing import Iterator, List, Dict, Tuple, Optional
 from collections import defaultdict
 import logging
+import os
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from database import write_tx
 
 logger = logging.getLogger(__name__)
 
 
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time-ordered UUIDv7 (RFC 9562).
+    
+    The leading 48 bits are the Unix time in milliseconds, so new document
+    IDs sort after older ones and inserts land at the right edge of the
+    documents primary key B-tree instead of on random pages.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76                         # version 7
+        | (rand >> 68) << 64                # rand_a: 12 bits
+        | 0b10 << 62                        # RFC 4122 variant
+        | rand & 0x3FFF_FFFF_FFFF_FFFF      # rand_b: 62 bits
+    )
+    return uuid.UUID(int=value)
+
+class DocumentCache:
+    """
+    Small thread-safe TTL LRU cache for documents fetched by ID.
+    
+    Shared by both repository implementations so repeated reads of a hot
+    document (e.g. a UI re-polling it) skip SQLite. Entries are invalidated
+    on writes and expire after a short TTL, so reads may be up to ttl
+    seconds stale with respect to writes from other processes.
+    
+    The cache is bounded by the approximate size of the stored content as
+    well as by entry count, and hands out shallow copies so callers cannot
+    mutate a shared entry.
+    """
+    
+    def __init__(self, maxsize: int = 1024, maxbytes: int = 64 * 1024 * 1024, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _entry_size(doc: Dict) -> int:
+        """Approximate the memory held by a cached document, dominated by its content."""
+        return len(doc.get("content") or "") + 1024
+    
+    def _evict(self, doc_id: str) -> None:
+        _, size, _ = self._entries.pop(doc_id)
+        self._bytes -= size
+    
+    def get(self, doc_id: str) -> Optional[Dict]:
+        """Return a copy of the cached document, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._evict(doc_id)
+                return None
+            self._entries.move_to_end(doc_id)
+            return dict(entry[2])
+    
+    def put(self, doc_id: str, doc: Dict) -> None:
+        """Cache a copy of a document, evicting the least recently used while over budget."""
+        size = self._entry_size(doc)
+        with self._lock:
+            if doc_id in self._entries:
+                self._evict(doc_id)
+            if size > self.maxbytes:
+                return
+            self._entries[doc_id] = (time.monotonic() + self.ttl, size, dict(doc))
+            self._bytes += size
+            while len(self._entries) > self.maxsize or self._bytes > self.maxbytes:
+                self._evict(next(iter(self._entries)))
+    
+    def invalidate(self, *doc_ids: Optional[str]) -> None:
+        """Drop the given documents from the cache."""
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self._entries:
+                    self._evict(doc_id)
+
+
+# Process-wide cache; repositories are built per request, so it cannot live on them
+document_cache = DocumentCache()
+
+# Separator for GROUP_CONCAT lists; the ASCII unit separator never appears in IDs or tags
+LIST_SEPARATOR = chr(31)
+
+# Column order of every documents query that builds dicts positionally
+DOCUMENT_COLUMNS = (
+    "id", "type", "title", "content", "source_url", "status", "processing_error",
+    "retry_count", "max_retries", "next_attempt_at", "last_error",
+    "created_at", "updated_at",
+)
+DOCUMENT_SELECT = ", ".join(f"d.{column}" for column in DOCUMENT_COLUMNS)
+
+
+
+def _relation_columns(doc_id: str) -> str:
+    """GROUP_CONCAT subqueries for the tags and linked IDs of the row doc_id names."""
+    return f"""
+        (SELECT GROUP_CONCAT(tag, char(31)) FROM document_tags
+            WHERE document_id = {doc_id}) AS tags,
+        (SELECT GROUP_CONCAT(linked_id, char(31)) FROM (
+            SELECT target_doc_id AS linked_id FROM document_links WHERE source_doc_id = {doc_id}
+            UNION
+            SELECT source_doc_id FROM document_links WHERE target_doc_id = {doc_id}
+        )) AS linked_document_ids"""
+
+
+# Fetch a document with its tags and linked document IDs in one statement
+DOCUMENT_BY_ID_SQL = f"""
+    SELECT {DOCUMENT_SELECT},{_relation_columns("d.id")}
+    FROM documents d
+    WHERE d.id = :id
+"""
+
+# One page of documents, newest first
+DOCUMENT_PAGE_SQL = f"""
+    SELECT {DOCUMENT_SELECT} FROM documents d
+    ORDER BY d.created_at DESC 
+    LIMIT :limit OFFSET :offset
+"""
+
+# Failed documents due for another attempt, oldest first (idx_documents_retry)
+DOCUMENT_RETRY_SQL = f"""
+    SELECT {DOCUMENT_SELECT} FROM documents d
+    WHERE d.status = 'failed' 
+    AND d.retry_count < :max_retries
+    AND (d.next_attempt_at IS NULL OR d.next_attempt_at <= :now)
+    ORDER BY d.created_at ASC
+    LIMIT 50
+"""
+
+# Move the failed documents due for another attempt straight to 'processing'
+# and return them with their tags and links, all in one statement. SQLite
+# runs one writer at a time, so two overlapping retry cycles can never claim
+# the same row; RETURNING order is unspecified, so callers sort.
+CLAIM_RETRY_SQL = f"""
+    UPDATE documents SET status = 'processing', updated_at = :now
+    WHERE id IN (
+        SELECT id FROM documents
+        WHERE status = 'failed'
+        AND retry_count < :max_retries
+        AND (next_attempt_at IS NULL OR next_attempt_at <= :now)
+        ORDER BY created_at ASC
+        LIMIT :limit
+    )
+    RETURNING {", ".join(DOCUMENT_COLUMNS)},{_relation_columns("documents.id")}
+"""
+
+# When the next retryable failed document falls due, for scheduling the retry
+# loop; '' when one has no scheduled time (due now), NULL when none is waiting
+NEXT_RETRY_DUE_SQL = """
+    SELECT MIN(IFNULL(next_attempt_at, '')) FROM documents
+    WHERE status = 'failed' AND retry_count < :max_retries
+"""
+
+# Put documents cut off mid-run back to 'pending'. Only used at startup, when
+# nothing in this process can be processing yet
+RESET_PROCESSING_SQL = """
+    UPDATE documents SET status = 'pending', updated_at = :now
+    WHERE status = 'processing'
+"""
+
+# Documents accepted but not yet processed, in the order they arrived
+PENDING_IDS_SQL = """
+    SELECT id FROM documents WHERE status = 'pending' ORDER BY created_at ASC
+"""
+
+# Plain status change; kept as one constant so both repositories issue the
+# same text and hit each connection's prepared statement cache
+UPDATE_STATUS_SQL = """
+    UPDATE documents 
+    SET status = :status, updated_at = :updated_at
+    WHERE id = :id
+"""
+
+# Record a failed attempt and schedule the next one in a single statement.
+# Exponential backoff from updated_at: 1 min, 2 min, 4 min, 8 min, capped at
+# 10 minutes; the shift is clamped since SQLite shifts past 63 bits yield 0.
+# The delay is scaled by a random factor in [0.5, 1.5) so documents that
+# failed together (e.g. during an Ollama outage) are not retried together.
+# SET expressions see the pre-update retry_count, so no SELECT is needed.
+# The result keeps isoformat()'s 'T' separator so string comparisons hold;
+# strftime() and the modulo operator are avoided because databases
+# %-formats the SQL it logs.
+MARK_FAILED_SQL = """
+    UPDATE documents 
+    SET status = :status, processing_error = :error, last_error = :error, 
+        updated_at = :updated_at, retry_count = retry_count + 1,
+        next_attempt_at = replace(datetime(
+            :updated_at, '+' || CAST(
+                MIN(60 << MIN(retry_count, 4), 600) * (0.5 + (random() & 1023) / 1024.0)
+            AS INTEGER) || ' seconds'
+        ), ' ', 'T')
+    WHERE id = :id
+"""
+
+
+def document_with_relations(row) -> Dict:
+    """
+    Build a document dict from a DOCUMENT_BY_ID_SQL row.
+    
+    Zips the DOCUMENT_COLUMNS values positionally rather than going through
+    the row's name lookup; the GROUP_CONCAT columns after them are split
+    into the tags and linked_document_ids lists.
+    """
+    doc = dict(zip(DOCUMENT_COLUMNS, row))
+    n = len(DOCUMENT_COLUMNS)
+    tags, linked = row[n], row[n + 1]
+    doc["tags"] = tags.split(LIST_SEPARATOR) if tags else []
+    doc["linked_document_ids"] = linked.split(LIST_SEPARATOR) if linked else []
+    return doc
+
+
+@dataclass(slots=True)
+class DocumentRow:
+    """
+    Fixed-shape document record returned by the list reads.
+    
+    Fields follow DOCUMENT_COLUMNS, so a row unpacks straight into it with
+    DocumentRow(*row); slots keep each record smaller than a 15-key dict.
+    """
+    id: str
+    type: str
+    title: str
+    content: str
+    source_url: Optional[str]
+    status: str
+    processing_error: Optional[str]
+    retry_count: int
+    max_retries: int
+    next_attempt_at: Optional[str]
+    last_error: Optional[str]
+    created_at: str
+    updated_at: str
+    tags: List[str] = field(default_factory=list)
+    linked_document_ids: List[str] = field(default_factory=list)
+
+
+def new_document(doc_id: str, doc_data: Dict, current_time: str) -> Dict:
+    """
+    Build the dict for a document that create() has just inserted.
+    
+    Mirrors what get_by_id would read back, including the column defaults
+    from SCHEMA_SQL, so create() does not need to re-query it.
+    """
+    link_to_doc_id = doc_data.get("link_to_doc_id")
+    return {
+        "id": doc_id,
+        "type": doc_data["type"],
+        "title": doc_data["title"],
+        "content": doc_data["content"],
+        "source_url": doc_data.get("source_url"),
+        "status": "pending",
+        "processing_error": None,
+        "retry_count": 0,
+        "max_retries": 3,
+        "next_attempt_at": None,
+        "last_error": None,
+        "created_at": current_time,
+        "updated_at": current_time,
+        "tags": list(doc_data.get("tags") or []),
+        "linked_document_ids": [link_to_doc_id] if link_to_doc_id else [],
+    }
+
+@lru_cache(maxsize=32)
+def _in_placeholders(n: int) -> str:
+    """Named placeholders :id0..:id{n-1} for an IN list of n document IDs."""
+    return ", ".join(f":id{i}" for i in range(n))
+
+
+def in_params(doc_ids: List[str]) -> Dict[str, str]:
+    """Bind values matching _in_placeholders(len(doc_ids))."""
+    return {f"id{i}": doc_id for i, doc_id in enumerate(doc_ids)}
+
+
+@lru_cache(maxsize=32)
+def relations_sql(n: int) -> str:
+    """
+    Tags and links of a page of n documents, fetched in one statement.
+    
+    Each row is (kind, document_id, value): kind 't' carries a tag, 'l_out'
+    and 'l_in' carry a document linked from or to document_id. Cached per n
+    so a given page size always yields the same SQL text and sqlite3's
+    statement cache reuses the prepared statement.
+    """
+    placeholders = _in_placeholders(n)
+    return f"""
+        SELECT 't' AS kind, document_id, tag AS value
+        FROM document_tags WHERE document_id IN ({placeholders})
+        UNION ALL
+        SELECT 'l_out', source_doc_id, target_doc_id
+        FROM document_links WHERE source_doc_id IN ({placeholders})
+        UNION ALL
+        SELECT 'l_in', target_doc_id, source_doc_id
+        FROM document_links WHERE target_doc_id IN ({placeholders})
+    """
+
+
+@lru_cache(maxsize=32)
+def claim_sql(n: int) -> str:
+    """
+    Move n documents to 'processing' and return them in one statement.
+    
+    Rows have the DOCUMENT_BY_ID_SQL shape, so document_with_relations
+    builds them; RETURNING order is unspecified.
+    """
+    return f"""
+        UPDATE documents SET status = 'processing', updated_at = :now
+        WHERE id IN ({_in_placeholders(n)})
+        RETURNING {", ".join(DOCUMENT_COLUMNS)},{_relation_columns("documents.id")}
+    """
+
+
+@lru_cache(maxsize=32)
+def status_many_sql(n: int) -> str:
+    """Set the status of n documents in one statement."""
+    return f"""
+        UPDATE documents 
+        SET status = :status, updated_at = :updated_at
+        WHERE id IN ({_in_placeholders(n)})
+    """
+
+
+def attach_relations(documents: List[DocumentRow], rows) -> None:
+    """
+    Set tags and linked_document_ids on documents from relations_sql rows.
+    
+    Args:
+        documents: Documents of the page, modified in place
+        rows: Rows returned by relations_sql for the same documents
+    """
+    tags_map = defaultdict(list)
+    links_map = defaultdict(set)  # Use set to avoid duplicates
+    for row in rows:
+        if row[0] == "t":
+            tags_map[row[1]].append(row[2])
+        else:
+            links_map[row[1]].add(row[2])
+    
+    for doc in documents:
+        doc.tags = tags_map.get(doc.id, [])
+        doc.linked_document_ids = list(links_map.get(doc.id, []))
+
+
 class DocumentRepository:
     """Repository for document data access operations."""
     
@@ -36,80 +393,111 @@ class DocumentRepository:
         Returns:
             The created document as a dictionary
         """
-        doc_id = str(uuid.uuid4())
+        doc_id = str(uuid7())
         current_time = datetime.utcnow().isoformat()
         
-        cursor = self.connection.cursor()
-        cursor.execute("""
-            INSERT INTO documents 
-            (id, type, title, content, source_url, status, retry_count, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            doc_id,
-            doc_data["type"],
-            doc_data["title"],
-            doc_data["content"],
-            doc_data.get("source_url"),
-            "pending",
-            0,
-            current_time,
-            current_time
-        ))
-        
-        # Insert tags if provided
-        if "tags" in doc_data and doc_data["tags"]:
-            for tag in doc_data["tags"]:
-                cursor.execute("""
+        # Take the write lock upfront so the whole insert is one immediate transaction
+        with write_tx(self.connection):
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                INSERT INTO documents 
+                (id, type, title, content, source_url, status, retry_count, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                doc_id,
+                doc_data["type"],
+                doc_data["title"],
+                doc_data["content"],
+                doc_data.get("source_url"),
+                "pending",
+                0,
+                current_time,
+                current_time
+            ))
+            
+            # Insert tags if provided
+            if "tags" in doc_data and doc_data["tags"]:
+                cursor.executemany("""
                     INSERT INTO document_tags (document_id, tag)
                     VALUES (?, ?)
-                """, (doc_id, tag))
-        
-        # Link to another document if specified
-        if "link_to_doc_id" in doc_data and doc_data["link_to_doc_id"]:
-            cursor.execute("""
-                INSERT INTO document_links (source_doc_id, target_doc_id)
-                VALUES (?, ?)
-            """, (doc_id, doc_data["link_to_doc_id"]))
+                """, [(doc_id, tag) for tag in doc_data["tags"]])
+            
+            # Link to another document if specified
+            if "link_to_doc_id" in doc_data and doc_data["link_to_doc_id"]:
+                cursor.execute("""
+                    INSERT INTO document_links (source_doc_id, target_doc_id)
+                    VALUES (?, ?)
+                """, (doc_id, doc_data["link_to_doc_id"]))
         
-        self.connection.commit()
+        # The link target's linked_document_ids just changed
+        document_cache.invalidate(doc_data.get("link_to_doc_id"))
         
-        # Fetch and return the created document
-        return self.get_by_id(doc_id)
+        # Everything in the new row is known here, so skip reading it back
+        doc = new_document(doc_id, doc_data, current_time)
+        document_cache.put(doc_id, doc)
+        return doc
     
-    def get_by_id(self, doc_id: str) -> Optional[Dict]:
+    def get_by_id(self, doc_id: str, use_cache: bool = False) -> Optional[Dict]:
         """
         Retrieve a document by its ID.
         
         Args:
             doc_id: Document ID
+            use_cache: Serve from, and populate, the short-lived document cache.
+                Only the HTTP read path opts in; internal callers want fresh rows.
             
         Returns:
             Document as a dictionary or None if not found
         """
+        if use_cache:
+            cached = document_cache.get(doc_id)
+            if cached is not None:
+                return cached
+        
         cursor = self.connection.cursor()
-        cursor.execute("SELECT * FROM documents WHERE id = ?", (doc_id,))
+        cursor.execute(DOCUMENT_BY_ID_SQL, {"id": doc_id})
         row = cursor.fetchone()
         
         if not row:
             return None
         
-        doc = dict(row)
+        doc = document_with_relations(row)
         
-        # Fetch tags
-        cursor.execute("SELECT tag FROM document_tags WHERE document_id = ?", (doc_id,))
-        doc["tags"] = [row[0] for row in cursor.fetchall()]
+        if use_cache:
+            document_cache.put(doc_id, doc)
+        return doc
+    
+    def iter_content(self, doc_id: str, chunk_size: int = 65536) -> Optional[Iterator[bytes]]:
+        """
+        Stream a document's content without loading it into memory whole.
         
-        # Fetch linked document IDs
-        cursor.execute("""
-            SELECT target_doc_id FROM document_links WHERE source_doc_id = ?
-            UNION
-            SELECT source_doc_id FROM document_links WHERE target_doc_id = ?
-        """, (doc_id, doc_id))
-        doc["linked_document_ids"] = [row[0] for row in cursor.fetchall()]
+        Uses SQLite incremental BLOB I/O, which also reads TEXT columns, so
+        at most chunk_size bytes of UTF-8 are held per step.
         
-        return doc
+        Args:
+            doc_id: Document ID
+            chunk_size: Maximum number of bytes per yielded chunk
+            
+        Returns:
+            Iterator of UTF-8 encoded chunks, or None if not found
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT rowid FROM documents WHERE id = ?", (doc_id,))
+        row = cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        blob = self.connection.blobopen("documents", "content", row[0], readonly=True)
+        
+        def chunks() -> Iterator[bytes]:
+            with blob:
+                while chunk := blob.read(chunk_size):
+                    yield chunk
+        
+        return chunks()
     
-    def get_all(self, limit: int = 20, offset: int = 0) -> Tuple[List[Dict], int]:
+    def get_all(self, limit: int = 20, offset: int = 0) -> Tuple[List[DocumentRow], int]:
         """
         Retrieve documents with pagination.
         
@@ -127,62 +515,33 @@ class DocumentRepository:
         total = cursor.fetchone()[0]
         
         # Get paginated documents
-        cursor.execute("""
-            SELECT * FROM documents 
-            ORDER BY created_at DESC 
-            LIMIT ? OFFSET ?
-        """, (limit, offset))
-        
-        documents = []
-        doc_ids = []
+        cursor.execute(DOCUMENT_PAGE_SQL, {"limit": limit, "offset": offset})
         
-        # First, collect all documents and their IDs
-        for row in cursor.fetchall():
-            doc = dict(row)
-            documents.append(doc)
-            doc_ids.append(doc["id"])
+        # Build documents straight off the cursor, without a fetchall() copy
+        documents = [DocumentRow(*row) for row in cursor]
         
         # If no documents, return early
-        if not doc_ids:
+        if not documents:
             return documents, total
         
-        # Bulk fetch all tags for the retrieved documents
-        placeholders = ','.join('?' * len(doc_ids))
-        cursor.execute(f"""
-            SELECT document_id, tag 
-            FROM document_tags 
-            WHERE document_id IN ({placeholders})
-        """, doc_ids)
-        
-        # Map tags to documents using defaultdict
-        tags_map = defaultdict(list)
-        for doc_id, tag in cursor.fetchall():
-            tags_map[doc_id].append(tag)
-        
-        # Bulk fetch all links for the retrieved documents
-        cursor.execute(f"""
-            SELECT source_doc_id, target_doc_id 
-            FROM document_links 
-            WHERE source_doc_id IN ({placeholders}) 
-               OR target_doc_id IN ({placeholders})
-        """, doc_ids + doc_ids)  # doc_ids twice for both conditions
-        
-        # Map links to documents
-        links_map = defaultdict(set)  # Use set to avoid duplicates
-        for source_id, target_id in cursor.fetchall():
-            if source_id in doc_ids:
-                links_map[source_id].add(target_id)
-            if target_id in doc_ids:
-                links_map[target_id].add(source_id)
-        
-        # Attach tags and links to documents
-        for doc in documents:
-            doc_id = doc["id"]
-            doc["tags"] = tags_map.get(doc_id, [])
-            doc["linked_document_ids"] = list(links_map.get(doc_id, []))
-        
+        self._hydrate(documents)
         return documents, total
     
+    def _hydrate(self, documents: List[DocumentRow]) -> None:
+        """
+        Bulk fetch tags and links for a list of documents and attach them.
+        
+        Args:
+            documents: Records to fill in, modified in place
+        """
+        if not documents:
+            return
+        
+        doc_ids = [doc.id for doc in documents]
+        cursor = self.connection.cursor()
+        cursor.execute(relations_sql(len(doc_ids)), in_params(doc_ids))
+        attach_relations(documents, cursor)
+    
     def update_status(self, doc_id: str, status: str, 
                      processing_error: Optional[str] = None) -> None:
         """
@@ -196,35 +555,91 @@ class DocumentRepository:
         cursor = self.connection.cursor()
         current_time = datetime.utcnow().isoformat()
         
-        if processing_error:
-            # Get current retry count for exponential backoff
-            cursor.execute("SELECT retry_count FROM documents WHERE id = ?", (doc_id,))
-            result = cursor.fetchone()
-            retry_count = result[0] if result else 0
-            
-            # Exponential backoff: 1 min, 2 min, 4 min, 8 min, etc.
-            # Cap at 10 minutes (600 seconds)
-            delay_seconds = min(60 * (2 ** retry_count), 600)
-            next_attempt = datetime.utcnow() + timedelta(seconds=delay_seconds)
-            next_attempt_str = next_attempt.isoformat()
+        with write_tx(self.connection):
+            if processing_error:
+                cursor.execute(MARK_FAILED_SQL, {
+                    "status": status,
+                    "error": processing_error,
+                    "updated_at": current_time,
+                    "id": doc_id
+                })
+            else:
+                cursor.execute(UPDATE_STATUS_SQL, {
+                    "status": status,
+                    "updated_at": current_time,
+                    "id": doc_id
+                })
+        
+        # Invalidate after commit so a concurrent read cannot re-cache the old row
+        document_cache.invalidate(doc_id)
+    
+    def update_status_many(self, doc_ids: List[str], status: str) -> None:
+        """
+        Update the processing status of several documents at once.
+        
+        Args:
+            doc_ids: Document IDs
+            status: New status
+        """
+        if not doc_ids:
+            return
+        
+        params = in_params(doc_ids)
+        params.update(status=status, updated_at=datetime.utcnow().isoformat())
+        with write_tx(self.connection):
+            self.connection.execute(status_many_sql(len(doc_ids)), params)
+        
+        for doc_id in doc_ids:
+            document_cache.invalidate(doc_id)
+    
+    def mark_failed_many(self, failures: List[Tuple[str, str]]) -> None:
+        """
+        Record a failed attempt for several documents at once.
+        
+        Runs MARK_FAILED_SQL through executemany in one transaction, so each
+        document still gets its own error and backoff.
+        
+        Args:
+            failures: (document ID, error message) pairs
+        """
+        if not failures:
+            return
+        
+        current_time = datetime.utcnow().isoformat()
+        with write_tx(self.connection):
+            self.connection.executemany(MARK_FAILED_SQL, [
+                {"status": "failed", "error": error, "updated_at": current_time, "id": doc_id}
+                for doc_id, error in failures
+            ])
+        
+        for doc_id, _ in failures:
+            document_cache.invalidate(doc_id)
+    
+    def claim_documents(self, doc_ids: List[str]) -> List[Dict]:
+        """
+        Mark documents as processing and return them.
+        
+        Args:
+            doc_ids: Document IDs
             
-            cursor.execute("""
-                UPDATE documents 
-                SET status = ?, processing_error = ?, last_error = ?, 
-                    updated_at = ?, retry_count = retry_count + 1,
-                    next_attempt_at = ?
-                WHERE id = ?
-            """, (status, processing_error, processing_error, current_time, next_attempt_str, doc_id))
-        else:
-            cursor.execute("""
-                UPDATE documents 
-                SET status = ?, updated_at = ?
-                WHERE id = ?
-            """, (status, current_time, doc_id))
+        Returns:
+            The documents found, in doc_ids order, with tags and links
+        """
+        if not doc_ids:
+            return []
+        
+        params = in_params(doc_ids)
+        params["now"] = datetime.utcnow().isoformat()
+        cursor = self.connection.cursor()
+        with write_tx(self.connection):
+            cursor.execute(claim_sql(len(doc_ids)), params)
+            found = {row[0]: document_with_relations(row) for row in cursor.fetchall()}
         
-        self.connection.commit()
+        for doc_id in found:
+            document_cache.invalidate(doc_id)
+        return [found[doc_id] for doc_id in doc_ids if doc_id in found]
     
-    def get_failed_documents_for_retry(self, max_retries: int = 3) -> List[Dict]:
+    def get_failed_documents_for_retry(self, max_retries: int = 3) -> List[DocumentRow]:
         """
         Get documents that failed but can be retried.
         
@@ -232,22 +647,77 @@ class DocumentRepository:
             max_retries: Maximum number of retries allowed
             
         Returns:
-            List of documents eligible for retry
+            List of documents eligible for retry, with tags and links
         """
         cursor = self.connection.cursor()
-        current_time = datetime.utcnow().isoformat()
+        cursor.execute(DOCUMENT_RETRY_SQL, {
+            "max_retries": max_retries,
+            "now": datetime.utcnow().isoformat()
+        })
+        
+        # Hydrated like get_all, so callers never need a follow-up read
+        documents = [DocumentRow(*row) for row in cursor]
+        self._hydrate(documents)
+        
+        return documents
+    
+    def get_next_retry_due(self, max_retries: int = 3) -> Optional[str]:
+        """
+        Get when the next failed document becomes due for retry.
+        
+        Args:
+            max_retries: Maximum number of retries allowed
+            
+        Returns:
+            ISO timestamp of the earliest due time, '' if a document is due
+            now without a scheduled time, or None if nothing awaits retry
+        """
+        row = self.connection.execute(
+            NEXT_RETRY_DUE_SQL, {"max_retries": max_retries}
+        ).fetchone()
+        return row[0]
+    
+    def recover_unfinished(self) -> List[str]:
+        """
+        Reset documents left in 'processing' to 'pending' and list the pending ones.
+        
+        Only call this at startup, before any document is queued: the ingest
+        queue lives in memory, so documents a previous run accepted but never
+        finished would otherwise stay pending or processing for good.
+        
+        Returns:
+            IDs of the documents to queue again, oldest first
+        """
+        cursor = self.connection.cursor()
+        with write_tx(self.connection):
+            cursor.execute(RESET_PROCESSING_SQL, {"now": datetime.utcnow().isoformat()})
+            cursor.execute(PENDING_IDS_SQL)
+            doc_ids = [row[0] for row in cursor.fetchall()]
         
-        cursor.execute("""
-            SELECT * FROM documents 
-            WHERE status = 'failed' 
-            AND retry_count < ?
-            AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
-            ORDER BY created_at ASC
-            LIMIT 50
-        """, (max_retries, current_time))
+        document_cache.invalidate(*doc_ids)
+        return doc_ids
+    
+    def claim_failed_for_retry(self, max_retries: int = 3, limit: int = 50) -> List[Dict]:
+        """
+        Mark failed documents due for retry as processing and return them.
         
-        documents = []
-        for row in cursor.fetchall():
-            documents.append(dict(row))
+        Args:
+            max_retries: Maximum number of retries allowed
+            limit: Maximum number of documents to claim
+            
+        Returns:
+            The claimed documents, oldest first, with tags and links
+        """
+        cursor = self.connection.cursor()
+        with write_tx(self.connection):
+            cursor.execute(CLAIM_RETRY_SQL, {
+                "max_retries": max_retries,
+                "now": datetime.utcnow().isoformat(),
+                "limit": limit
+            })
+            documents = [document_with_relations(row) for row in cursor.fetchall()]
         
+        for doc in documents:
+            document_cache.invalidate(doc["id"])
+        documents.sort(key=itemgetter("created_at"))
         return documents
\ No newline at end of file
@@ -4,28 +4,37 @@ Async repository pattern implementation for Synapse backend.
 This module contains async repository classes that use the databases library
 for non-blocking database operations with connection pooling.
 """
-from typing import List, Dict, Tuple, Optional
-from collections import defaultdict
+from typing import AsyncIterator, List, Dict, Tuple, Optional
 import logging
-import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
+from operator import itemgetter
 
 from databases import Database
 
+from database_async import write_transaction
+from repositories import (
+    CLAIM_RETRY_SQL, DOCUMENT_BY_ID_SQL, DOCUMENT_PAGE_SQL, DOCUMENT_RETRY_SQL, MARK_FAILED_SQL,
+    NEXT_RETRY_DUE_SQL, PENDING_IDS_SQL, RESET_PROCESSING_SQL, UPDATE_STATUS_SQL, DocumentRow, attach_relations, document_cache, document_with_relations,
+    claim_sql, in_params, new_document, relations_sql, status_many_sql, uuid7
+)
+
 logger = logging.getLogger(__name__)
 
 
 class DocumentRepositoryAsync:
     """Async repository for document data access operations."""
     
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, read_database: Optional[Database] = None):
         """
         Initialize the repository with an async database instance.
         
         Args:
-            database: Databases instance with connection pool
+            database: Databases instance used for writes
+            read_database: Optional read-only instance used for queries;
+                falls back to the write instance when not provided
         """
         self.database = database
+        self.read_database = read_database or database
     
     async def create(self, doc_data: Dict) -> Dict:
         """
@@ -37,7 +46,7 @@ class DocumentRepositoryAsync:
         Returns:
             The created document as a dictionary
         """
-        doc_id = str(uuid.uuid4())
+        doc_id = str(uuid7())
         current_time = datetime.utcnow().isoformat()
         
         # Insert main document
@@ -57,69 +66,103 @@ class DocumentRepositoryAsync:
             "created_at": current_time,
             "updated_at": current_time
         }
-        await self.database.execute(query=query, values=values)
-        
-        # Insert tags if provided
-        if "tags" in doc_data and doc_data["tags"]:
-            tag_query = """
-                INSERT INTO document_tags (document_id, tag)
-                VALUES (:document_id, :tag)
-            """
-            tag_values = [{"document_id": doc_id, "tag": tag} for tag in doc_data["tags"]]
-            await self.database.execute_many(query=tag_query, values=tag_values)
-        
-        # Link to another document if specified
-        if "link_to_doc_id" in doc_data and doc_data["link_to_doc_id"]:
-            link_query = """
-                INSERT INTO document_links (source_doc_id, target_doc_id)
-                VALUES (:source_doc_id, :target_doc_id)
-            """
-            link_values = {
-                "source_doc_id": doc_id,
-                "target_doc_id": doc_data["link_to_doc_id"]
-            }
-            await self.database.execute(query=link_query, values=link_values)
-        
-        # Fetch and return the created document
-        return await self.get_by_id(doc_id)
+        # All inserts share one immediate transaction (single commit)
+        async with write_transaction(self.database):
+            await self.database.execute(query=query, values=values)
+        
+            # Insert tags if provided
+            if "tags" in doc_data and doc_data["tags"]:
+                tag_query = """
+                    INSERT INTO document_tags (document_id, tag)
+                    VALUES (:document_id, :tag)
+                """
+                tag_values = [{"document_id": doc_id, "tag": tag} for tag in doc_data["tags"]]
+                await self.database.execute_many(query=tag_query, values=tag_values)
+        
+            # Link to another document if specified
+            if "link_to_doc_id" in doc_data and doc_data["link_to_doc_id"]:
+                link_query = """
+                    INSERT INTO document_links (source_doc_id, target_doc_id)
+                    VALUES (:source_doc_id, :target_doc_id)
+                """
+                link_values = {
+                    "source_doc_id": doc_id,
+                    "target_doc_id": doc_data["link_to_doc_id"]
+                }
+                await self.database.execute(query=link_query, values=link_values)
+        
+        # The link target's linked_document_ids just changed
+        document_cache.invalidate(doc_data.get("link_to_doc_id"))
+        
+        # Everything in the new row is known here, so skip reading it back
+        doc = new_document(doc_id, doc_data, current_time)
+        document_cache.put(doc_id, doc)
+        return doc
     
-    async def get_by_id(self, doc_id: str) -> Optional[Dict]:
+    async def get_by_id(self, doc_id: str, use_cache: bool = False) -> Optional[Dict]:
         """
         Retrieve a document by its ID.
         
         Args:
             doc_id: Document ID
+            use_cache: Serve from, and populate, the short-lived document cache.
+                Only the HTTP read path opts in; internal callers want fresh rows.
             
         Returns:
             Document as a dictionary or None if not found
         """
-        # Fetch main document
-        query = "SELECT * FROM documents WHERE id = :id"
-        row = await self.database.fetch_one(query=query, values={"id": doc_id})
+        if use_cache:
+            cached = document_cache.get(doc_id)
+            if cached is not None:
+                return cached
+        
+        row = await self.read_database.fetch_one(query=DOCUMENT_BY_ID_SQL, values={"id": doc_id})
         
         if not row:
             return None
         
-        # Convert row to dict
-        doc = dict(row._mapping)
+        doc = document_with_relations(row._mapping)
+        
+        if use_cache:
+            document_cache.put(doc_id, doc)
+        return doc
+    
+    async def iter_content(self, doc_id: str, chunk_size: int = 65536) -> Optional[AsyncIterator[bytes]]:
+        """
+        Stream a document's content without loading it into memory whole.
         
-        # Fetch tags
-        tag_query = "SELECT tag FROM document_tags WHERE document_id = :document_id"
-        tag_rows = await self.database.fetch_all(query=tag_query, values={"document_id": doc_id})
-        doc["tags"] = [row["tag"] for row in tag_rows]
+        aiosqlite has no incremental BLOB I/O, so each chunk is a substr()
+        over the UTF-8 bytes of the column; at most chunk_size bytes are
+        held per step.
         
-        # Fetch linked document IDs
-        link_query = """
-            SELECT target_doc_id FROM document_links WHERE source_doc_id = :doc_id
-            UNION
-            SELECT source_doc_id FROM document_links WHERE target_doc_id = :doc_id
+        Args:
+            doc_id: Document ID
+            chunk_size: Maximum number of bytes per yielded chunk
+            
+        Returns:
+            Async iterator of UTF-8 encoded chunks, or None if not found
         """
-        link_rows = await self.database.fetch_all(query=link_query, values={"doc_id": doc_id})
-        doc["linked_document_ids"] = [row[0] for row in link_rows]
+        size = await self.read_database.fetch_val(
+            query="SELECT length(CAST(content AS BLOB)) FROM documents WHERE id = :id",
+            values={"id": doc_id}
+        )
         
-        return doc
+        if size is None:
+            return None
+        
+        async def chunks() -> AsyncIterator[bytes]:
+            for start in range(1, size + 1, chunk_size):
+                yield await self.read_database.fetch_val(
+                    query="""
+                        SELECT substr(CAST(content AS BLOB), :start, :length)
+                        FROM documents WHERE id = :id
+                    """,
+                    values={"id": doc_id, "start": start, "length": chunk_size}
+                )
+        
+        return chunks()
     
-    async def get_all(self, limit: int = 20, offset: int = 0) -> Tuple[List[Dict], int]:
+    async def get_all(self, limit: int = 20, offset: int = 0) -> Tuple[List[DocumentRow], int]:
         """
         Retrieve documents with pagination.
         
@@ -132,80 +175,38 @@ class DocumentRepositoryAsync:
         """
         # Get total count
         count_query = "SELECT COUNT(*) as count FROM documents"
-        count_result = await self.database.fetch_one(query=count_query)
+        count_result = await self.read_database.fetch_one(query=count_query)
         total = count_result["count"]
         
         # Get paginated documents
-        docs_query = """
-            SELECT * FROM documents 
-            ORDER BY created_at DESC 
-            LIMIT :limit OFFSET :offset
-        """
-        rows = await self.database.fetch_all(
-            query=docs_query, 
+        rows = await self.read_database.fetch_all(
+            query=DOCUMENT_PAGE_SQL, 
             values={"limit": limit, "offset": offset}
         )
         
         if not rows:
             return [], total
         
-        # Convert rows to documents and collect IDs
-        documents = []
-        doc_ids = []
-        for row in rows:
-            doc = dict(row._mapping)
-            documents.append(doc)
-            doc_ids.append(doc["id"])
-        
-        # Bulk fetch all tags for the retrieved documents
-        if doc_ids:
-            # Create parameterized query for IN clause
-            placeholders = ', '.join([f':id{i}' for i in range(len(doc_ids))])
-            tags_query = f"""
-                SELECT document_id, tag 
-                FROM document_tags 
-                WHERE document_id IN ({placeholders})
-            """
-            tags_values = {f'id{i}': doc_id for i, doc_id in enumerate(doc_ids)}
-            tag_rows = await self.database.fetch_all(query=tags_query, values=tags_values)
-            
-            # Map tags to documents
-            tags_map = defaultdict(list)
-            for row in tag_rows:
-                tags_map[row["document_id"]].append(row["tag"])
-            
-            # Bulk fetch all links for the retrieved documents
-            # Create separate placeholders for second condition
-            placeholders2 = ', '.join([f':id2_{i}' for i in range(len(doc_ids))])
-            links_query = f"""
-                SELECT source_doc_id, target_doc_id 
-                FROM document_links 
-                WHERE source_doc_id IN ({placeholders}) 
-                   OR target_doc_id IN ({placeholders2})
-            """
-            # Create values for both conditions
-            links_values = {**tags_values}
-            links_values.update({f'id2_{i}': doc_id for i, doc_id in enumerate(doc_ids)})
-            link_rows = await self.database.fetch_all(query=links_query, values=links_values)
-            
-            # Map links to documents
-            links_map = defaultdict(set)
-            for row in link_rows:
-                source_id = row["source_doc_id"]
-                target_id = row["target_doc_id"]
-                if source_id in doc_ids:
-                    links_map[source_id].add(target_id)
-                if target_id in doc_ids:
-                    links_map[target_id].add(source_id)
-            
-            # Attach tags and links to documents
-            for doc in documents:
-                doc_id = doc["id"]
-                doc["tags"] = tags_map.get(doc_id, [])
-                doc["linked_document_ids"] = list(links_map.get(doc_id, []))
-        
+        documents = [DocumentRow(*row._mapping) for row in rows]
+        await self._hydrate(documents)
         return documents, total
     
+    async def _hydrate(self, documents: List[DocumentRow]) -> None:
+        """
+        Bulk fetch tags and links for a list of documents and attach them.
+        
+        Args:
+            documents: Records to fill in, modified in place
+        """
+        if not documents:
+            return
+        
+        doc_ids = [doc.id for doc in documents]
+        relation_rows = await self.read_database.fetch_all(
+            query=relations_sql(len(doc_ids)), values=in_params(doc_ids)
+        )
+        attach_relations(documents, relation_rows)
+    
     async def update_status(self, doc_id: str, status: str, 
                           processing_error: Optional[str] = None) -> None:
         """
@@ -218,48 +219,95 @@ class DocumentRepositoryAsync:
         """
         current_time = datetime.utcnow().isoformat()
         
-        if processing_error:
-            # Calculate next retry time with exponential backoff
-            # Base delay: 60 seconds, exponential factor: 2
-            retry_query = "SELECT retry_count FROM documents WHERE id = :id"
-            result = await self.database.fetch_one(query=retry_query, values={"id": doc_id})
-            retry_count = result["retry_count"] if result else 0
+        async with write_transaction(self.database):
+            if processing_error:
+                query = MARK_FAILED_SQL
+                values = {
+                    "status": status,
+                    "error": processing_error,
+                    "updated_at": current_time,
+                    "id": doc_id
+                }
+            else:
+                query = UPDATE_STATUS_SQL
+                values = {
+                    "status": status,
+                    "updated_at": current_time,
+                    "id": doc_id
+                }
             
-            # Exponential backoff: 1 min, 2 min, 4 min, 8 min, etc.
-            # Cap at 10 minutes (600 seconds)
-            delay_seconds = min(60 * (2 ** retry_count), 600)
-            next_attempt = datetime.utcnow() + timedelta(seconds=delay_seconds)
-            next_attempt_str = next_attempt.isoformat()
+            await self.database.execute(query=query, values=values)
+        
+        # Invalidate after commit so a concurrent read cannot re-cache the old row
+        document_cache.invalidate(doc_id)
+    
+    async def update_status_many(self, doc_ids: List[str], status: str) -> None:
+        """
+        Update the processing status of several documents at once.
+        
+        Args:
+            doc_ids: Document IDs
+            status: New status
+        """
+        if not doc_ids:
+            return
+        
+        values = in_params(doc_ids)
+        values.update(status=status, updated_at=datetime.utcnow().isoformat())
+        async with write_transaction(self.database):
+            await self.database.execute(query=status_many_sql(len(doc_ids)), values=values)
+        
+        for doc_id in doc_ids:
+            document_cache.invalidate(doc_id)
+    
+    async def mark_failed_many(self, failures: List[Tuple[str, str]]) -> None:
+        """
+        Record a failed attempt for several documents at once.
+        
+        Runs MARK_FAILED_SQL through execute_many in one transaction, so each
+        document still gets its own error and backoff.
+        
+        Args:
+            failures: (document ID, error message) pairs
+        """
+        if not failures:
+            return
+        
+        current_time = datetime.utcnow().isoformat()
+        values = [
+            {"status": "failed", "error": error, "updated_at": current_time, "id": doc_id}
+            for doc_id, error in failures
+        ]
+        async with write_transaction(self.database):
+            await self.database.execute_many(query=MARK_FAILED_SQL, values=values)
+        
+        for doc_id, _ in failures:
+            document_cache.invalidate(doc_id)
+    
+    async def claim_documents(self, doc_ids: List[str]) -> List[Dict]:
+        """
+        Mark documents as processing and return them.
+        
+        Args:
+            doc_ids: Document IDs
             
-            query = """
-                UPDATE documents 
-                SET status = :status, processing_error = :error, last_error = :error,
-                    updated_at = :updated_at, retry_count = retry_count + 1,
-                    next_attempt_at = :next_attempt
-                WHERE id = :id
-            """
-            values = {
-                "status": status,
-                "error": processing_error,
-                "updated_at": current_time,
-                "next_attempt": next_attempt_str,
-                "id": doc_id
-            }
-        else:
-            query = """
-                UPDATE documents 
-                SET status = :status, updated_at = :updated_at
-                WHERE id = :id
-            """
-            values = {
-                "status": status,
-                "updated_at": current_time,
-                "id": doc_id
-            }
-        
-        await self.database.execute(query=query, values=values)
+        Returns:
+            The documents found, in doc_ids order, with tags and links
+        """
+        if not doc_ids:
+            return []
+        
+        values = in_params(doc_ids)
+        values["now"] = datetime.utcnow().isoformat()
+        async with write_transaction(self.database):
+            rows = await self.database.fetch_all(query=claim_sql(len(doc_ids)), values=values)
+        
+        found = {doc["id"]: doc for doc in (document_with_relations(row._mapping) for row in rows)}
+        for doc_id in found:
+            document_cache.invalidate(doc_id)
+        return [found[doc_id] for doc_id in doc_ids if doc_id in found]
     
-    async def get_failed_documents_for_retry(self, max_retries: int = 3) -> List[Dict]:
+    async def get_failed_documents_for_retry(self, max_retries: int = 3) -> List[DocumentRow]:
         """
         Get documents that failed but can be retried.
         
@@ -267,26 +315,77 @@ class DocumentRepositoryAsync:
             max_retries: Maximum number of retries allowed
             
         Returns:
-            List of documents eligible for retry
-        """
-        query = """
-            SELECT * FROM documents 
-            WHERE status = 'failed' 
-            AND retry_count < :max_retries
-            AND (next_attempt_at IS NULL OR next_attempt_at <= :now)
-            ORDER BY created_at ASC
-            LIMIT 50
+            List of documents eligible for retry, with tags and links
         """
         values = {
             "max_retries": max_retries,
             "now": datetime.utcnow().isoformat()
         }
+        rows = await self.read_database.fetch_all(query=DOCUMENT_RETRY_SQL, values=values)
+        
+        # Hydrated like get_all, so callers never need a follow-up read
+        documents = [DocumentRow(*row._mapping) for row in rows]
+        await self._hydrate(documents)
+        
+        return documents
+    
+    async def get_next_retry_due(self, max_retries: int = 3) -> Optional[str]:
+        """
+        Get when the next failed document becomes due for retry.
+        
+        Args:
+            max_retries: Maximum number of retries allowed
+            
+        Returns:
+            ISO timestamp of the earliest due time, '' if a document is due
+            now without a scheduled time, or None if nothing awaits retry
+        """
+        return await self.read_database.fetch_val(
+            query=NEXT_RETRY_DUE_SQL, values={"max_retries": max_retries}
+        )
+    
+    async def recover_unfinished(self) -> List[str]:
+        """
+        Reset documents left in 'processing' to 'pending' and list the pending ones.
+        
+        Only call this at startup, before any document is queued: the ingest
+        queue lives in memory, so documents a previous run accepted but never
+        finished would otherwise stay pending or processing for good.
+        
+        Returns:
+            IDs of the documents to queue again, oldest first
+        """
+        async with write_transaction(self.database):
+            await self.database.execute(
+                query=RESET_PROCESSING_SQL, values={"now": datetime.utcnow().isoformat()}
+            )
+            rows = await self.database.fetch_all(query=PENDING_IDS_SQL)
         
-        rows = await self.database.fetch_all(query=query, values=values)
+        doc_ids = [row[0] for row in rows]
+        document_cache.invalidate(*doc_ids)
+        return doc_ids
+    
+    async def claim_failed_for_retry(self, max_retries: int = 3, limit: int = 50) -> List[Dict]:
+        """
+        Mark failed documents due for retry as processing and return them.
         
-        # Convert rows to dicts
-        documents = []
-        for row in rows:
-            documents.append(dict(row._mapping))
+        Args:
+            max_retries: Maximum number of retries allowed
+            limit: Maximum number of documents to claim
+            
+        Returns:
+            The claimed documents, oldest first, with tags and links
+        """
+        values = {
+            "max_retries": max_retries,
+            "now": datetime.utcnow().isoformat(),
+            "limit": limit
+        }
+        async with write_transaction(self.database):
+            rows = await self.database.fetch_all(query=CLAIM_RETRY_SQL, values=values)
         
-        return documents
\ No newline at end of file
+        documents = [document_with_relations(row._mapping) for row in rows]
+        for doc in documents:
+            document_cache.invalidate(doc["id"])
+        documents.sort(key=itemgetter("created_at"))
+        return documents
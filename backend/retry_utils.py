@@ -1,11 +1,14 @@
 """
 Retry utilities for handling transient failures in external services.
 """
+import asyncio
+import inspect
 import logging
-import time
 from functools import wraps
-from typing import Callable, Any
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from typing import Callable, Any, Type
+
+import httpx
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
 
 logger = logging.getLogger(__name__)
 
@@ -21,59 +24,88 @@ class ChromaDBConnectionError(Exception):
     pass
 
 
-def ollama_retry(func: Callable) -> Callable:
-    """
-    Decorator to retry Ollama operations with exponential backoff.
-    """
-    @wraps(func)
-    def wrapper(*args, **kwargs) -> Any:
-        @retry(
-            stop=stop_after_attempt(3),
-            wait=wait_exponential(multiplier=1, min=2, max=10),
-            retry=retry_if_exception_type((ConnectionError, OllamaConnectionError)),
-            before_sleep=lambda retry_state: logger.warning(
-                f"Ollama operation failed, retrying in {retry_state.next_action.sleep} seconds..."
-            )
-        )
-        def _retry_func():
-            try:
-                return func(*args, **kwargs)
-            except (ConnectionError, ConnectionRefusedError) as e:
-                raise OllamaConnectionError(f"Failed to connect to Ollama: {e}")
-            except Exception as e:
-                if "connection" in str(e).lower():
-                    raise OllamaConnectionError(f"Ollama connection error: {e}")
-                raise
-        
-        return _retry_func()
-    
-    return wrapper
+# Transport-level failures worth retrying. The Ollama helpers and the
+# chromadb client both talk HTTP through httpx, and the ollama client turns
+# refused connections into the builtin ConnectionError.
+TRANSIENT_ERRORS = (ConnectionError, httpx.TransportError)
+
 
+def _as_ollama_error(e: Exception) -> Exception:
+    """Map connection failures to OllamaConnectionError so they are retried."""
+    if isinstance(e, TRANSIENT_ERRORS):
+        return OllamaConnectionError(f"Failed to connect to Ollama: {e}")
+    return e
 
-def chromadb_retry(func: Callable) -> Callable:
+
+def _as_chromadb_error(e: Exception) -> Exception:
+    """Map connection failures to ChromaDBConnectionError so they are retried."""
+    if isinstance(e, TRANSIENT_ERRORS):
+        return ChromaDBConnectionError(f"Failed to connect to ChromaDB: {e}")
+    return e
+
+
+def _service_retry(
+    service: str,
+    error_type: Type[Exception],
+    map_error: Callable[[Exception], Exception]
+) -> Callable[[Callable], Callable]:
     """
-    Decorator to retry ChromaDB operations with exponential backoff.
+    Build a retry decorator for one external service.
+    
+    Backoff is exponential with jitter so concurrent callers retrying the
+    same outage spread out instead of hitting the service in lockstep.
+    Coroutine functions get an async wrapper whose backoff awaits
+    asyncio.sleep, so retries never block the event loop.
     """
-    @wraps(func)
-    def wrapper(*args, **kwargs) -> Any:
-        @retry(
-            stop=stop_after_attempt(3),
-            wait=wait_exponential(multiplier=1, min=2, max=10),
-            retry=retry_if_exception_type((ConnectionError, ChromaDBConnectionError)),
-            before_sleep=lambda retry_state: logger.warning(
-                f"ChromaDB operation failed, retrying in {retry_state.next_action.sleep} seconds..."
-            )
+    def log_retry(retry_state) -> None:
+        logger.warning(
+            "%s operation failed, retrying in %.2f seconds...",
+            service, retry_state.next_action.sleep
         )
-        def _retry_func():
+    
+    # Policy objects are stateless, so build them once per service; tenacity
+    # copies its Retrying object per call, so the decorated function is safe
+    # to call concurrently
+    policy = dict(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(initial=0.1, max=5),
+        retry=retry_if_exception_type((ConnectionError, error_type)),
+        before_sleep=log_retry
+    )
+    
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @retry(sleep=asyncio.sleep, **policy)
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    mapped = map_error(e)
+                    if mapped is e:
+                        raise
+                    raise mapped
+            
+            return async_wrapper
+        
+        @retry(**policy)
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
             try:
                 return func(*args, **kwargs)
-            except (ConnectionError, ConnectionRefusedError) as e:
-                raise ChromaDBConnectionError(f"Failed to connect to ChromaDB: {e}")
             except Exception as e:
-                if "connection" in str(e).lower() or "chroma" in str(e).lower():
-                    raise ChromaDBConnectionError(f"ChromaDB connection error: {e}")
-                raise
+                mapped = map_error(e)
+                if mapped is e:
+                    raise
+                raise mapped
         
-        return _retry_func()
+        return wrapper
     
-    return wrapper
\ No newline at end of file
+    return decorator
+
+
+# Decorator to retry Ollama operations with jittered exponential backoff
+ollama_retry = _service_retry("Ollama", OllamaConnectionError, _as_ollama_error)
+
+# Decorator to retry ChromaDB operations with jittered exponential backoff
+chromadb_retry = _service_retry("ChromaDB", ChromaDBConnectionError, _as_chromadb_error)
@@ -4,9 +4,9 @@ from datetime import datetime
 from enum import Enum
 
 try:
-    from config import settings
+    from config import get_settings
 except ImportError:
-    from config import settings
+    from config import get_settings
 
 
 # Enums
@@ -50,8 +50,10 @@ class DocumentCreate(BaseModel):
     @classmethod
     def validate_content_size(cls, v: str) -> str:
         """Validate that content isn't too large."""
-        content_size = len(v.encode('utf-8'))
-        max_size = settings.max_content_size
+        # ASCII text is one byte per character, so skip encoding a possibly
+        # multi-MB copy just to measure it
+        content_size = len(v) if v.isascii() else len(v.encode('utf-8'))
+        max_size = get_settings().max_content_size
         if content_size > max_size:
             raise ValueError(f'Content size ({content_size} bytes) exceeds limit ({max_size} bytes)')
         return v
@@ -75,17 +77,15 @@ class Document(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
     @classmethod
-    def from_db_row(cls, row: dict) -> "Document":
+    def from_db_row(cls, row: Any) -> "Document":
         """
         Creates a Document model from a database row.
         Handles conversion from SQLite row to Pydantic model.
-        """
-        # Convert ISO string timestamps to datetime objects
-        row_dict = dict(row)
-        row_dict["created_at"] = datetime.fromisoformat(row_dict["created_at"])
-        row_dict["updated_at"] = datetime.fromisoformat(row_dict["updated_at"])
         
-        return cls(**row_dict)
+        Accepts a row dict or an attribute record such as the repositories'
+        DocumentRow; unknown columns are ignored.
+        """
+        return cls.model_validate(row)
 
 
 class DocumentResponse(Document):
@@ -140,4 +140,11 @@ class ChatResponse(BaseModel):
     """Model for chat/query responses."""
     answer: str = Field(..., description="The generated answer based on the knowledge base")
     sources: Optional[List[Dict[str, Any]]] = Field(None, description="Source documents used to generate the answer")
-    query_time_ms: Optional[int] = Field(None, description="Time taken to process the query in milliseconds")
\ No newline at end of file
+    query_time_ms: Optional[int] = Field(None, description="Time taken to process the query in milliseconds")
+
+
+class WalCheckpointResponse(BaseModel):
+    """Model for the result of an on-demand WAL checkpoint."""
+    busy: bool = Field(..., description="Whether the checkpoint was blocked by an active reader or writer")
+    log_frames: int = Field(..., description="Frames in the WAL file before the checkpoint")
+    checkpointed_frames: int = Field(..., description="Frames copied back into the database file")
@@ -158,4 +158,4 @@ echo ""
 # Run with Python path set correctly
 cd "$REPO_ROOT"
 export PYTHONPATH="$REPO_ROOT:${PYTHONPATH:-}"
-python -m uvicorn backend.main:app --reload --host 127.0.0.1 --port $PORT
\ No newline at end of file
+python -m uvicorn backend.main:app --reload --host 127.0.0.1 --port $PORT --loop uvloop --http httptools
\ No newline at end of file
@@ -13,4 +13,4 @@ export CHROMA_PORT=8102
 export OLLAMA_BASE_URL=http://localhost:11434
 
 # Start the backend
-uvicorn main:app --host 0.0.0.0 --port 8101 --reload
\ No newline at end of file
+uvicorn main:app --host 0.0.0.0 --port 8101 --loop uvloop --http httptools --reload
\ No newline at end of file
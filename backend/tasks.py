@@ -6,114 +6,326 @@ after API endpoints return responses to clients. It's designed to decouple
 the web layer from task execution logic, making it easier to migrate to
 dedicated task queues (like Celery or Dramatiq) in the future.
 """
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
 from haystack import Document as HaystackDocument
 
 import database
 from pipelines import get_indexing_pipeline
 from repositories import DocumentRepository
-from config import settings
+from config import get_settings
+from retry_utils import TRANSIENT_ERRORS, ChromaDBConnectionError, OllamaConnectionError
 
 # Import async modules when feature flag is enabled
-if settings.use_async_db:
+if get_settings().use_async_db:
     import database_async
     from repositories_async import DocumentRepositoryAsync
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
+# Set when a document fails so the retry loop wakes and reschedules for its due time
+retry_wakeup = asyncio.Event()
+
+
+async def wait_for_retry_wakeup(timeout: float) -> None:
+    """
+    Wait until a retry is requested or the timeout elapses, whichever is first.
+    Clears the wake-up flag so the next failure triggers a fresh cycle.
+    """
+    try:
+        await asyncio.wait_for(retry_wakeup.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    retry_wakeup.clear()
+
+
+async def seconds_until_next_retry(max_wait: float) -> float:
+    """
+    Seconds until the earliest failed document is due for another attempt.
+    
+    Failures are scheduled with a backoff, so waking the retry loop the
+    moment one happens would find nothing due; the loop sleeps this long
+    instead. Capped at max_wait, which is also returned when nothing is
+    waiting to be retried.
+    """
+    due = await task_repository().get_next_retry_due()
+    if due is None:
+        return max_wait
+    if not due:
+        return 0.0
+    delay = (datetime.fromisoformat(due) - datetime.utcnow()).total_seconds()
+    return min(max(delay, 0.0), max_wait)
+
+
+# Held while a retry cycle runs, so an overlapping cycle in this process skips
+# instead of waiting. Across processes the claim itself keeps cycles apart.
+_retry_cycle_lock = asyncio.Lock()
+
+# Events of requests waiting for a document to finish processing, by document ID
+_processing_watchers: Dict[str, Set[asyncio.Event]] = {}
+
+
+@contextmanager
+def watch_processing(doc_id: str) -> Iterator[asyncio.Event]:
+    """
+    Yield an event that is set once doc_id finishes processing (completed or failed).
+    
+    Enter before reading the document's status, so a finish between that
+    read and the wait is not missed. Only processing in this process is seen.
+    """
+    event = asyncio.Event()
+    watchers = _processing_watchers.setdefault(doc_id, set())
+    watchers.add(event)
+    try:
+        yield event
+    finally:
+        watchers.discard(event)
+        if not watchers:
+            del _processing_watchers[doc_id]
+
+
+def _notify_finished(doc_ids: Iterable[str]) -> None:
+    """Wake the watchers of documents that were just marked completed or failed."""
+    if not _processing_watchers:
+        return
+    for doc_id in doc_ids:
+        for event in _processing_watchers.get(doc_id, ()):
+            event.set()
+
+
+class _PooledDocumentRepository:
+    """
+    Awaitable view of DocumentRepository for background tasks in sync mode.
+    
+    Each call borrows a pooled connection for just that call and runs it in
+    a worker thread, so no connection sits idle while the pipeline runs and
+    the event loop never blocks on sqlite3. Mirrors the DocumentRepositoryAsync
+    methods the tasks use, so they can await either one.
+    """
+    
+    @staticmethod
+    async def _run(method, *args):
+        def call():
+            with database.pooled_connection() as conn:
+                return method(DocumentRepository(conn), *args)
+        return await asyncio.to_thread(call)
+    
+    async def get_by_id(self, doc_id: str) -> Optional[Dict]:
+        return await self._run(DocumentRepository.get_by_id, doc_id)
+    
+    async def update_status(self, doc_id: str, status: str,
+                            processing_error: Optional[str] = None) -> None:
+        await self._run(DocumentRepository.update_status, doc_id, status, processing_error)
+    
+    async def update_status_many(self, doc_ids: List[str], status: str) -> None:
+        await self._run(DocumentRepository.update_status_many, doc_ids, status)
+    
+    async def mark_failed_many(self, failures: List[Tuple[str, str]]) -> None:
+        await self._run(DocumentRepository.mark_failed_many, failures)
+    
+    async def claim_documents(self, doc_ids: List[str]) -> List[Dict]:
+        return await self._run(DocumentRepository.claim_documents, doc_ids)
+    
+    async def get_next_retry_due(self) -> Optional[str]:
+        return await self._run(DocumentRepository.get_next_retry_due)
+    
+    async def claim_failed_for_retry(self) -> List[Dict]:
+        return await self._run(DocumentRepository.claim_failed_for_retry)
+    
+    async def recover_unfinished(self) -> List[str]:
+        return await self._run(DocumentRepository.recover_unfinished)
+
+
+def _async_task_repository() -> "DocumentRepositoryAsync":
+    """Async repository over the shared database pools."""
+    return DocumentRepositoryAsync(
+        database_async.get_database_instance(),
+        database_async.get_read_database_instance()
+    )
+
+
+# Repository factory for background tasks and other code that should not hold
+# a request-scoped connection. The feature flag is fixed for the process (the
+# async modules are only imported under it), so pick once here rather than
+# branching on every call.
+task_repository = (
+    _async_task_repository if get_settings().use_async_db else _PooledDocumentRepository
+)
+
+
+# Document fields copied into the metadata of every indexed chunk; the
+# document ID is stored under "doc_id"
+_META_FIELDS = ("title", "type", "source_url", "tags", "created_at")
+
+
+def _to_haystack_document(doc_data: Dict) -> HaystackDocument:
+    """
+    Convert a document row into the Haystack Document the indexing pipeline takes.
+    Both repositories always return tags as a list, so no fallback is needed.
+    """
+    meta = {field: doc_data[field] for field in _META_FIELDS}
+    meta["doc_id"] = doc_data["id"]
+    return HaystackDocument(content=doc_data["content"], meta=meta)
+
+
+class DocumentNotFoundError(ValueError):
+    """Raised when a queued document no longer exists."""
+
+
+# Failures with a known cause (missing document, Ollama or Chroma unreachable);
+# these are logged without a traceback, which would add nothing but cost when
+# an outage fails a whole retry cycle
+_EXPECTED_ERRORS = (
+    DocumentNotFoundError, OllamaConnectionError, ChromaDBConnectionError, *TRANSIENT_ERRORS
+)
+
+
+def _log_processing_error(doc_id: str, error: Exception) -> None:
+    """Log a document processing failure, with a traceback only if it is unexpected."""
+    if isinstance(error, _EXPECTED_ERRORS):
+        logger.warning("Error processing document %s: %s", doc_id, error)
+    else:
+        logger.error("Error processing document %s: %s", doc_id, error, exc_info=error)
+
+
+def _error_message(error: Exception) -> str:
+    """Error text stored on a failed document, limited to prevent database issues."""
+    return str(error)[:500]
+
+
+# Threads running the indexing pipeline, kept apart from the default executor so
+# long embedding runs never queue ahead of short database calls and health probes
+_indexing_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_indexing_executor() -> ThreadPoolExecutor:
+    """Get or create the executor dedicated to indexing pipeline runs."""
+    global _indexing_executor
+    if _indexing_executor is None:
+        _indexing_executor = ThreadPoolExecutor(
+            max_workers=get_settings().pipeline_workers, thread_name_prefix="indexing"
+        )
+    return _indexing_executor
+
+
+def shutdown_indexing_executor() -> None:
+    """Drop queued pipeline runs and release the indexing threads."""
+    global _indexing_executor
+    if _indexing_executor is not None:
+        _indexing_executor.shutdown(wait=False, cancel_futures=True)
+        _indexing_executor = None
+
+
+async def _index_documents(docs: List[Dict]) -> None:
+    """Run the indexing pipeline over already-claimed documents."""
+    indexing_pipeline = get_indexing_pipeline()
+    haystack_docs = [_to_haystack_document(doc) for doc in docs]
+    # Off the event loop: splitting and embedding block for seconds
+    result = await asyncio.get_running_loop().run_in_executor(
+        get_indexing_executor(), indexing_pipeline.run, {"documents": haystack_docs}
+    )
+    
+    # Log pipeline result
+    if result and "writer" in result:
+        written_docs = result["writer"].get("documents_written", 0)
+        logger.info("Successfully indexed %s chunks for %d documents", written_docs, len(docs))
+
 
 # Background task for document processing
-async def process_document_background(doc_id: str):
+async def process_document_background(doc_id: str, doc_data: Optional[Dict] = None):
     """
     Process document in the background using Haystack RAG pipeline.
     This function runs asynchronously after returning 202 to the client.
-    Supports both sync and async database operations based on feature flag.
+    Supports both sync and async database operations based on feature flag;
+    no database connection is held while the pipeline runs.
+    
+    When doc_data is given the document has already been claimed (moved to
+    processing and read back), so the status update and fetch are skipped.
     """
-    logger.info(f"Starting background processing for document {doc_id}")
+    logger.info("Starting background processing for document %s", doc_id)
     
-    # Create database repository based on feature flag
-    conn = None
-    repo = None
+    repo = task_repository()
     
     try:
-        if settings.use_async_db:
-            # Async database operations
-            repo = DocumentRepositoryAsync(database_async.database)
-            
+        if doc_data is None:
             # Update status to processing
             await repo.update_status(doc_id, "processing")
-            logger.info(f"Updated document {doc_id} status to processing")
+            logger.info("Updated document %s status to processing", doc_id)
             
             # Fetch document from database
             doc_data = await repo.get_by_id(doc_id)
-        else:
-            # Sync database operations (existing logic)
-            conn = database.get_db_connection()
-            repo = DocumentRepository(conn)
-            
-            # Update status to processing
-            repo.update_status(doc_id, "processing")
-            logger.info(f"Updated document {doc_id} status to processing")
-            
-            # Fetch document from database
-            doc_data = repo.get_by_id(doc_id)
             
         if not doc_data:
-            raise ValueError(f"Document {doc_id} not found in database")
-        
-        # Convert to Haystack Document format
-        haystack_doc = HaystackDocument(
-            content=doc_data["content"],
-            meta={
-                "doc_id": doc_data["id"],
-                "title": doc_data["title"],
-                "type": doc_data["type"],
-                "source_url": doc_data["source_url"],
-                "tags": doc_data["tags"] if doc_data["tags"] else [],
-                "created_at": doc_data["created_at"]
-            }
-        )
-        
-        # Get the indexing pipeline
-        indexing_pipeline = get_indexing_pipeline()
+            raise DocumentNotFoundError(f"Document {doc_id} not found in database")
         
         # Run the pipeline
-        logger.info(f"Running indexing pipeline for document {doc_id}")
-        result = indexing_pipeline.run({"documents": [haystack_doc]})
-        
-        # Log pipeline result
-        if result and "writer" in result:
-            written_docs = result["writer"].get("documents_written", 0)
-            logger.info(f"Successfully indexed {written_docs} chunks for document {doc_id}")
+        logger.info("Running indexing pipeline for document %s", doc_id)
+        await _index_documents([doc_data])
         
         # Update status to completed
-        if settings.use_async_db:
-            await repo.update_status(doc_id, "completed")
-        else:
-            repo.update_status(doc_id, "completed")
-        logger.info(f"Completed processing document {doc_id}")
+        await repo.update_status(doc_id, "completed")
+        _notify_finished([doc_id])
+        logger.info("Completed processing document %s", doc_id)
         
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Error processing document {doc_id}: {error_msg}", exc_info=True)
+        _log_processing_error(doc_id, e)
         
         # Update status to failed with error message
-        if repo:
-            try:
-                # Limit error message length to prevent database issues
-                truncated_error = error_msg[:500] if len(error_msg) > 500 else error_msg
-                if settings.use_async_db:
-                    await repo.update_status(doc_id, "failed", truncated_error)
-                else:
-                    repo.update_status(doc_id, "failed", truncated_error)
-            except Exception as update_error:
-                logger.error(f"Failed to update document status: {update_error}")
+        try:
+            await repo.update_status(doc_id, "failed", _error_message(e))
+            _notify_finished([doc_id])
+            retry_wakeup.set()
+        except Exception as update_error:
+            logger.error("Failed to update document status: %s", update_error)
+
+
+async def process_documents_batch(doc_ids: List[str]):
+    """
+    Index several queued documents with a single pipeline run.
     
-    finally:
-        # Ensure database connection is closed
-        if conn:
-            conn.close()
+    The documents are claimed in one statement and marked completed in one
+    more, and the embedder and writer see one batch instead of a request
+    per document. If the batched run fails, each document is processed on
+    its own so the error is recorded against the one that caused it.
+    A batch of one is claimed the same way, so every ingest starts with a
+    single UPDATE ... RETURNING.
+    """
+    logger.info("Starting batched processing of %d documents", len(doc_ids))
+    
+    repo = task_repository()
+    docs = await repo.claim_documents(doc_ids)
+    
+    if len(docs) < len(doc_ids):
+        logger.warning("%d queued documents not found in database", len(doc_ids) - len(docs))
+    if not docs:
+        return
+    
+    if len(docs) == 1:
+        # Already claimed; the single-document path records success or failure
+        await process_document_background(docs[0]["id"], docs[0])
+        return
+    
+    try:
+        await _index_documents(docs)
+    except Exception as e:
+        logger.warning(
+            "Batched indexing of %d documents failed, processing them one by one: %s",
+            len(docs), e
+        )
+        for doc in docs:
+            await process_document_background(doc["id"], doc)
+        return
+    
+    claimed_ids = [doc["id"] for doc in docs]
+    await repo.update_status_many(claimed_ids, "completed")
+    _notify_finished(claimed_ids)
+    logger.info("Completed processing documents %s", claimed_ids)
 
 
 async def retry_failed_documents_task():
@@ -121,52 +333,67 @@ async def retry_failed_documents_task():
     Background task that retries failed documents.
     This function checks for documents that failed processing but haven't 
     exceeded their retry limit and re-queues them for processing.
+    
+    Due documents are claimed in a single UPDATE ... RETURNING, which moves
+    them to processing and returns their data, so processing starts without
+    any further reads. Outcomes are written back once all documents finish,
+    in one statement for the completed ones and one batch for the failures.
+    
+    The claim is atomic (SQLite runs one writer at a time), so concurrent
+    cycles, even in other processes, never process the same document twice.
     """
+    if _retry_cycle_lock.locked():
+        logger.info("Another retry cycle is in progress, skipping")
+        return
+    
+    async with _retry_cycle_lock:
+        await _run_retry_cycle()
+
+
+async def _run_retry_cycle() -> None:
+    """Claim due failed documents, reprocess them and record the outcomes."""
+    settings = get_settings()
     logger.info("Starting retry cycle for failed documents")
     
+    repo = task_repository()
     try:
-        if settings.use_async_db:
-            # Async database operations
-            repo = DocumentRepositoryAsync(database_async.database)
-            failed_docs = await repo.get_failed_documents_for_retry()
-        else:
-            # Sync database operations
-            conn = database.get_db_connection()
-            try:
-                repo = DocumentRepository(conn)
-                failed_docs = repo.get_failed_documents_for_retry()
-            finally:
-                conn.close()
+        failed_docs = await repo.claim_failed_for_retry()
         
         if not failed_docs:
             logger.info("No failed documents found for retry")
             return
         
-        logger.info(f"Found {len(failed_docs)} documents to retry")
+        logger.info("Found %d documents to retry", len(failed_docs))
         
-        # Re-queue each document for processing
-        for doc in failed_docs:
-            doc_id = doc["id"]
-            retry_count = doc.get("retry_count", 0)
-            logger.info(f"Re-queuing document {doc_id} for retry (attempt #{retry_count + 1})")
-            
-            # Reset status to pending to trigger processing
-            if settings.use_async_db:
-                await repo.update_status(doc_id, "pending")
+        # Embedding is I/O-bound, so process the claimed documents concurrently,
+        # bounded so a large backlog does not swamp Ollama
+        semaphore = asyncio.Semaphore(settings.retry_concurrency)
+        
+        async def retry_one(doc) -> None:
+            async with semaphore:
+                logger.info("Retrying document %s (attempt #%d)", doc["id"], doc["retry_count"] + 1)
+                await _index_documents([doc])
+        
+        results = await asyncio.gather(
+            *(retry_one(doc) for doc in failed_docs), return_exceptions=True
+        )
+        
+        completed_ids = []
+        failures = []
+        for doc, result in zip(failed_docs, results):
+            if isinstance(result, Exception):
+                _log_processing_error(doc["id"], result)
+                failures.append((doc["id"], _error_message(result)))
             else:
-                conn = database.get_db_connection()
-                try:
-                    repo = DocumentRepository(conn)
-                    repo.update_status(doc_id, "pending")
-                finally:
-                    conn.close()
-            
-            # Queue the document for processing
-            # Note: In a real async environment, this would be better handled
-            # with a proper task queue, but for now we'll process directly
-            await process_document_background(doc_id)
+                completed_ids.append(doc["id"])
+        
+        await repo.update_status_many(completed_ids, "completed")
+        await repo.mark_failed_many(failures)
+        _notify_finished(doc["id"] for doc in failed_docs)
+        if failures:
+            retry_wakeup.set()
         
-        logger.info(f"Completed retry cycle, re-queued {len(failed_docs)} documents")
+        logger.info("Completed retry cycle, re-queued %d documents", len(failed_docs))
         
     except Exception as e:
-        logger.error(f"Error in retry task: {e}", exc_info=True)
\ No newline at end of file
+        logger.error("Error in retry task: %s", e, exc_info=True)
@@ -2,6 +2,7 @@
 Minimal pytest fixtures for testing the Synapse API.
 Provides TestClient and API headers for all tests.
 """
+import importlib.util
 import os
 import sys
 
@@ -14,18 +15,26 @@ from fastapi.testclient import TestClient
 
 # Import as package to handle relative imports in main.py
 from backend.main import app
-from backend.config import settings
+from backend.config import get_settings
 
+# Run the app on uvloop, as uvicorn --loop uvloop does in deployment; uvloop
+# comes with uvicorn[standard] but is unavailable on Windows
+BACKEND_OPTIONS = {"use_uvloop": importlib.util.find_spec("uvloop") is not None}
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
 def client():
-    """Test client for FastAPI app."""
+    """
+    Test client for FastAPI app, shared by the whole session.
+    Entering it runs the app lifespan (database init, pipeline warm-up,
+    workers), so it is started once rather than for every test.
+    """
     # Create client with the app directly - TestClient handles transport internally
-    with TestClient(app) as c:
+    with TestClient(app, backend_options=BACKEND_OPTIONS) as c:
         yield c
 
 
 @pytest.fixture
 def headers():
     """API headers with test API key."""
-    return {"X-API-Key": settings.internal_api_key}
\ No newline at end of file
+    return {"X-API-Key": get_settings().internal_api_key}
\ No newline at end of file
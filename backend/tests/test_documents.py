@@ -0,0 +1,122 @@
+"""
+Endpoint tests for single-document reads that do not need the RAG pipeline.
+Documents are stored directly through the repository, without queueing them
+for processing, so their status stays 'pending'.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from config import get_settings
+from repositories import DocumentRepository
+
+PENDING_DOC = {
+    "type": "general_note",
+    "title": "Pending test document",
+    "content": "Stored without being queued, so it is never processed.",
+    "tags": ["test"]
+}
+
+
+def insert_pending_document(client, doc_data=PENDING_DOC):
+    """Store a document on the app's event loop without queueing it; returns its ID."""
+    async def create():
+        if get_settings().use_async_db:
+            return await client.app.state.repository.create(doc_data)
+        with database.pooled_connection() as conn:
+            return DocumentRepository(conn).create(doc_data)
+
+    return client.portal.call(create)["id"]
+
+
+class FullQueue(asyncio.Queue):
+    """An ingest queue with no free slot that flags when a producer starts waiting."""
+
+    def __init__(self):
+        super().__init__(maxsize=1)
+        self.put_nowait("placeholder")
+        self.waiting = threading.Event()
+
+    async def put(self, item):
+        self.waiting.set()
+        await super().put(item)
+
+
+def test_create_waiting_on_full_queue_holds_no_writer(client, headers):
+    """A POST parked on a full ingest queue has already committed and released the writer."""
+    original_queue = client.app.state.ingest_queue
+    full_queue = FullQueue()
+    client.app.state.ingest_queue = full_queue
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            response = pool.submit(client.post, "/api/documents", json=PENDING_DOC, headers=headers)
+            try:
+                assert full_queue.waiting.wait(timeout=5)
+                if not get_settings().use_async_db:
+                    assert database._writer_lock.acquire(timeout=1)
+                    database._writer_lock.release()
+                # Other writes go ahead while the request waits
+                insert_pending_document(client)
+            finally:
+                client.portal.call(full_queue.get)
+            assert response.result(timeout=5).status_code == 202
+    finally:
+        client.app.state.ingest_queue = original_queue
+
+
+def test_wait_returns_current_state_after_timeout(client, headers):
+    """A document that never finishes is returned as-is once the timeout passes."""
+    doc_id = insert_pending_document(client)
+
+    started = time.perf_counter()
+    response = client.get(f"/api/documents/{doc_id}/wait?timeout=0.3", headers=headers)
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    assert response.json()["id"] == doc_id
+    assert response.json()["status"] == "pending"
+    assert elapsed >= 0.3
+
+
+def test_wait_unknown_document(client, headers):
+    """Waiting on a document that does not exist fails fast with 404."""
+    response = client.get("/api/documents/non-existent-id/wait?timeout=5", headers=headers)
+
+    assert response.status_code == 404
+
+
+def test_wait_rejects_out_of_range_timeout(client, headers):
+    """The wait is capped so a client cannot hold a request open indefinitely."""
+    response = client.get("/api/documents/non-existent-id/wait?timeout=61", headers=headers)
+
+    assert response.status_code == 422
+
+
+def test_content_streams_stored_bytes(client, headers):
+    """Streamed content matches the stored text byte for byte across chunk boundaries."""
+    # Multi-byte characters, and longer than the 64KB streaming chunk size
+    content = "Synapse ✓ héllo wörld\n" * 5000
+    doc_id = insert_pending_document(client, {**PENDING_DOC, "content": content})
+
+    response = client.get(f"/api/documents/{doc_id}/content", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.content == content.encode("utf-8")
+
+
+def test_content_unknown_document(client, headers):
+    """Streaming a document that does not exist returns 404."""
+    response = client.get("/api/documents/non-existent-id/content", headers=headers)
+
+    assert response.status_code == 404
+
+
+def test_wal_checkpoint(client, headers):
+    """The on-demand checkpoint reports SQLite's result in either database mode."""
+    response = client.post("/api/admin/wal-checkpoint", headers=headers)
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"busy", "log_frames", "checkpointed_frames"}
@@ -54,27 +54,25 @@ def create_and_process_document(client, headers):
     doc_id = result["doc_id"]
     print(f"✓ Document created with ID: {doc_id}")
     
-    # Poll for document status
-    print("\n=== CHECKING PROCESSING STATUS ===")
-    for i in range(30):  # Poll for up to 30 seconds
-        time.sleep(1)
-        status_response = client.get(
-            f"/api/documents/{doc_id}",
-            headers=headers
-        )
-        
-        assert status_response.status_code == 200
-        doc_status = status_response.json()
-        current_status = doc_status["status"]
-        print(f"Attempt {i+1}: Status = {current_status}")
-        
-        if current_status == "completed":
-            print("✓ Document processed successfully!")
-            print(f"Final document: {json.dumps(doc_status, indent=2)}")
-            return doc_id  # This is intentionally returned for use in test_chat_flow
-        elif current_status == "failed":
-            print(f"✗ Document processing failed: {doc_status.get('processing_error')}")
-            pytest.fail(f"Document processing failed: {doc_status.get('processing_error')}")
+    # Wait for processing to finish (the server answers as soon as it does)
+    print("\n=== WAITING FOR PROCESSING ===")
+    status_response = client.get(
+        f"/api/documents/{doc_id}/wait?timeout=30",
+        headers=headers
+    )
+    
+    assert status_response.status_code == 200
+    doc_status = status_response.json()
+    current_status = doc_status["status"]
+    print(f"Status = {current_status}")
+    
+    if current_status == "completed":
+        print("✓ Document processed successfully!")
+        print(f"Final document: {json.dumps(doc_status, indent=2)}")
+        return doc_id  # This is intentionally returned for use in test_chat_flow
+    elif current_status == "failed":
+        print(f"✗ Document processing failed: {doc_status.get('processing_error')}")
+        pytest.fail(f"Document processing failed: {doc_status.get('processing_error')}")
     
     pytest.fail("✗ Timeout waiting for document processing")
 
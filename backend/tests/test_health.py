@@ -0,0 +1,67 @@
+"""
+Unit tests for the /health probe cache.
+"""
+import asyncio
+
+import pytest
+
+from backend import main
+
+
+@pytest.fixture
+def probe():
+    """A fake dependency probe that counts its calls; set .impact to fail it."""
+    class Probe:
+        calls = 0
+        impact = None
+
+        async def __call__(self):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return {"status": "unhealthy" if self.impact else "healthy"}, self.impact
+
+    yield Probe()
+    main._health_cache.pop("test", None)
+    main._health_locks.pop("test", None)
+
+
+def check(probe):
+    return asyncio.run(main._cached_check("test", probe))
+
+
+def test_healthy_result_is_reused_within_ttl(probe):
+    first = check(probe)
+    second = check(probe)
+
+    assert first == second == ({"status": "healthy"}, None)
+    assert probe.calls == 1
+
+
+def test_result_is_refreshed_once_expired(probe, monkeypatch):
+    monkeypatch.setattr(main, "HEALTHY_TTL_SECONDS", 0.0)
+
+    check(probe)
+    check(probe)
+
+    assert probe.calls == 2
+
+
+def test_unhealthy_result_uses_its_own_ttl(probe, monkeypatch):
+    """A failure is cached for the shorter unhealthy TTL so recovery shows up quickly."""
+    monkeypatch.setattr(main, "UNHEALTHY_TTL_SECONDS", 0.0)
+    probe.impact = "degraded"
+
+    assert check(probe) == ({"status": "unhealthy"}, "degraded")
+    probe.impact = None
+    assert check(probe) == ({"status": "healthy"}, None)
+    assert probe.calls == 2
+
+
+def test_concurrent_callers_share_one_probe(probe):
+    async def burst():
+        return await asyncio.gather(*(main._cached_check("test", probe) for _ in range(5)))
+
+    results = asyncio.run(burst())
+
+    assert probe.calls == 1
+    assert all(result == ({"status": "healthy"}, None) for result in results)
@@ -0,0 +1,351 @@
+"""
+Unit tests for the sync document repository and its helpers.
+Each test gets its own private in-memory database, so no app is started.
+"""
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import SCHEMA_SQL, TunedConnection
+from repositories import DocumentCache, DocumentRepository, document_cache, uuid7
+
+DOC = {
+    "type": "general_note",
+    "title": "Repository test document",
+    "content": "Some content.",
+    "tags": ["test"]
+}
+
+
+@pytest.fixture
+def conn():
+    """Private in-memory database with the application schema."""
+    conn = sqlite3.connect(":memory:", factory=TunedConnection)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA_SQL)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def repo(conn):
+    return DocumentRepository(conn)
+
+
+def set_failed(conn, doc_id, retry_count=0, next_attempt_at=None, created_at=None):
+    """Put a document straight into the failed state, bypassing the repository."""
+    conn.execute(
+        "UPDATE documents SET status = 'failed', retry_count = ?, next_attempt_at = ?,"
+        " created_at = COALESCE(?, created_at) WHERE id = ?",
+        (retry_count, next_attempt_at, created_at, doc_id)
+    )
+    conn.commit()
+    document_cache.invalidate(doc_id)
+
+
+def get_status(conn, doc_id):
+    return conn.execute("SELECT status FROM documents WHERE id = ?", (doc_id,)).fetchone()[0]
+
+
+def backoff_delay(conn, doc_id):
+    """Seconds between a failure and its scheduled retry, with the row itself."""
+    row = conn.execute(
+        "SELECT retry_count, next_attempt_at, updated_at, last_error FROM documents WHERE id = ?",
+        (doc_id,)
+    ).fetchone()
+    # Kept comparable with isoformat() strings
+    assert "T" in row["next_attempt_at"]
+    # datetime() drops the fractional seconds of updated_at
+    delay = (
+        datetime.fromisoformat(row["next_attempt_at"])
+        - datetime.fromisoformat(row["updated_at"]).replace(microsecond=0)
+    ).total_seconds()
+    return delay, row
+
+
+# uuid7
+
+def test_uuid7_version_and_variant():
+    """IDs carry the version 7 and RFC 4122 variant bits."""
+    for _ in range(100):
+        value = uuid7()
+        assert value.version == 7
+        assert value.variant == "specified in RFC 4122"
+
+
+def test_uuid7_embeds_current_time():
+    """The leading 48 bits are the Unix time in milliseconds."""
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert before <= value.int >> 80 <= after
+
+
+def test_uuid7_orders_by_creation_time():
+    """IDs generated in later milliseconds sort after earlier ones, as strings too."""
+    ids = []
+    for _ in range(5):
+        ids.append(str(uuid7()))
+        time.sleep(0.002)
+
+    assert ids == sorted(ids)
+
+
+def test_created_documents_get_uuid7_ids(repo):
+    doc_id = repo.create(DOC)["id"]
+
+    assert uuid.UUID(doc_id).version == 7
+
+
+# Failure backoff
+
+@pytest.mark.parametrize("retry_count", [0, 1, 2, 3, 4, 6, 70])
+def test_mark_failed_backoff_is_jittered_within_range(conn, repo, retry_count):
+    """The next attempt is the capped exponential backoff scaled by [0.5, 1.5)."""
+    base = min(60 << min(retry_count, 4), 600)
+    delays = set()
+    for _ in range(20):
+        doc_id = repo.create(DOC)["id"]
+        set_failed(conn, doc_id, retry_count=retry_count)
+
+        repo.update_status(doc_id, "failed", "boom")
+
+        delay, row = backoff_delay(conn, doc_id)
+        assert base * 0.5 <= delay < base * 1.5
+        assert row["retry_count"] == retry_count + 1
+        assert row["last_error"] == "boom"
+        delays.add(delay)
+
+    # Documents that failed together are not all rescheduled together
+    assert len(delays) > 1
+
+
+def test_mark_failed_many_records_each_failure(conn, repo):
+    """Batched failures keep their own error and get their own backoff."""
+    doc_ids = [repo.create(DOC)["id"] for _ in range(3)]
+
+    repo.mark_failed_many([(doc_id, f"error {i}") for i, doc_id in enumerate(doc_ids)])
+
+    for i, doc_id in enumerate(doc_ids):
+        delay, row = backoff_delay(conn, doc_id)
+        assert 30 <= delay < 90
+        assert row["retry_count"] == 1
+        assert row["last_error"] == f"error {i}"
+        assert get_status(conn, doc_id) == "failed"
+
+
+def test_update_status_many(conn, repo):
+    doc_ids = [repo.create(DOC)["id"] for _ in range(3)]
+
+    repo.update_status_many(doc_ids[:2], "completed")
+
+    assert [get_status(conn, doc_id) for doc_id in doc_ids] == ["completed", "completed", "pending"]
+
+
+# Claims
+
+def test_claim_documents_returns_found_documents_in_order(conn, repo):
+    """Claimed documents move to processing and come back in request order."""
+    first = repo.create(DOC)["id"]
+    second = repo.create({**DOC, "title": "Second"})["id"]
+
+    claimed = repo.claim_documents([second, "missing-id", first])
+
+    assert [doc["id"] for doc in claimed] == [second, first]
+    assert all(doc["status"] == "processing" for doc in claimed)
+    assert claimed[0]["title"] == "Second"
+    assert claimed[0]["tags"] == ["test"]
+    assert get_status(conn, first) == get_status(conn, second) == "processing"
+
+
+def test_claim_documents_empty(repo):
+    assert repo.claim_documents([]) == []
+
+
+def test_claim_failed_for_retry_claims_only_due_documents(conn, repo):
+    """Only failed documents that are due and under the retry limit are claimed."""
+    past = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+    future = (datetime.utcnow() + timedelta(minutes=10)).isoformat()
+
+    unscheduled = repo.create(DOC)["id"]
+    due = repo.create(DOC)["id"]
+    not_due = repo.create(DOC)["id"]
+    exhausted = repo.create(DOC)["id"]
+    pending = repo.create(DOC)["id"]
+    set_failed(conn, unscheduled, created_at="2026-01-02T00:00:00")
+    set_failed(conn, due, next_attempt_at=past, created_at="2026-01-01T00:00:00")
+    set_failed(conn, not_due, next_attempt_at=future)
+    set_failed(conn, exhausted, retry_count=3, next_attempt_at=past)
+
+    claimed = repo.claim_failed_for_retry(max_retries=3)
+
+    # Oldest first, with tags
+    assert [doc["id"] for doc in claimed] == [due, unscheduled]
+    assert claimed[0]["tags"] == ["test"]
+    assert get_status(conn, due) == get_status(conn, unscheduled) == "processing"
+    assert get_status(conn, not_due) == get_status(conn, exhausted) == "failed"
+    assert get_status(conn, pending) == "pending"
+
+
+def test_claim_failed_for_retry_never_claims_twice(conn, repo):
+    """A claimed document has left 'failed', so an overlapping cycle gets nothing."""
+    doc_id = repo.create(DOC)["id"]
+    set_failed(conn, doc_id)
+
+    assert [doc["id"] for doc in repo.claim_failed_for_retry()] == [doc_id]
+    assert repo.claim_failed_for_retry() == []
+
+
+def test_claim_failed_for_retry_respects_limit(conn, repo):
+    doc_ids = [repo.create(DOC)["id"] for _ in range(3)]
+    for doc_id in doc_ids:
+        set_failed(conn, doc_id)
+
+    assert len(repo.claim_failed_for_retry(limit=2)) == 2
+    assert len(repo.claim_failed_for_retry(limit=2)) == 1
+
+
+def test_get_next_retry_due(conn, repo):
+    """The earliest due time is reported; '' means due now, None means nothing waits."""
+    assert repo.get_next_retry_due() is None
+
+    later = (datetime.utcnow() + timedelta(minutes=10)).isoformat()
+    sooner = (datetime.utcnow() + timedelta(minutes=5)).isoformat()
+    set_failed(conn, repo.create(DOC)["id"], next_attempt_at=later)
+    set_failed(conn, repo.create(DOC)["id"], next_attempt_at=sooner)
+    set_failed(conn, repo.create(DOC)["id"], retry_count=3)
+    assert repo.get_next_retry_due() == sooner
+
+    set_failed(conn, repo.create(DOC)["id"])
+    assert repo.get_next_retry_due() == ""
+
+
+
+def test_recover_unfinished_requeues_pending_and_interrupted_documents(conn, repo):
+    """Rows cut off mid-run go back to pending and come back with the pending ones, oldest first."""
+    interrupted = repo.create(DOC)["id"]
+    queued = repo.create(DOC)["id"]
+    failed = repo.create(DOC)["id"]
+    completed = repo.create(DOC)["id"]
+    repo.claim_documents([interrupted])
+    set_failed(conn, failed)
+    repo.update_status(completed, "completed")
+
+    assert repo.recover_unfinished() == [interrupted, queued]
+    assert get_status(conn, interrupted) == "pending"
+    assert get_status(conn, failed) == "failed"
+    assert get_status(conn, completed) == "completed"
+
+# Document cache
+
+def test_get_by_id_serves_cached_document_when_asked(conn, repo):
+    """Only use_cache=True reads skip SQLite; internal reads see the current row."""
+    doc_id = repo.create(DOC)["id"]
+    repo.get_by_id(doc_id, use_cache=True)
+    conn.execute("UPDATE documents SET title = 'Changed elsewhere' WHERE id = ?", (doc_id,))
+    conn.commit()
+
+    assert repo.get_by_id(doc_id, use_cache=True)["title"] == DOC["title"]
+    assert repo.get_by_id(doc_id)["title"] == "Changed elsewhere"
+
+
+def test_uncached_reads_do_not_fill_the_cache(repo):
+    doc_id = repo.create(DOC)["id"]
+    document_cache.invalidate(doc_id)
+
+    repo.get_by_id(doc_id)
+
+    assert document_cache.get(doc_id) is None
+
+
+@pytest.mark.parametrize("write", [
+    lambda repo, doc_id: repo.update_status(doc_id, "completed"),
+    lambda repo, doc_id: repo.update_status(doc_id, "failed", "boom"),
+    lambda repo, doc_id: repo.update_status_many([doc_id], "completed"),
+    lambda repo, doc_id: repo.mark_failed_many([(doc_id, "boom")]),
+    lambda repo, doc_id: repo.claim_documents([doc_id]),
+])
+def test_writes_invalidate_cached_document(conn, repo, write):
+    """A cached read after a write sees the new state rather than the cached row."""
+    doc_id = repo.create(DOC)["id"]
+    assert repo.get_by_id(doc_id, use_cache=True)["status"] == "pending"
+
+    write(repo, doc_id)
+
+    assert document_cache.get(doc_id) is None
+    assert repo.get_by_id(doc_id, use_cache=True)["status"] == get_status(conn, doc_id)
+
+
+def test_linking_invalidates_cached_target(repo):
+    """Creating a linked document refreshes the target's linked_document_ids."""
+    target_id = repo.create(DOC)["id"]
+    assert repo.get_by_id(target_id, use_cache=True)["linked_document_ids"] == []
+
+    source_id = repo.create({**DOC, "link_to_doc_id": target_id})["id"]
+
+    assert repo.get_by_id(target_id, use_cache=True)["linked_document_ids"] == [source_id]
+
+
+def test_cache_evicts_least_recently_used():
+    cache = DocumentCache(maxsize=2)
+    cache.put("a", {"content": ""})
+    cache.put("b", {"content": ""})
+    cache.get("a")
+    cache.put("c", {"content": ""})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_cache_hands_out_copies():
+    """Mutating a cached result, or the dict that was cached, leaves the entry intact."""
+    cache = DocumentCache()
+    doc = {"id": "a", "content": "original"}
+    cache.put("a", doc)
+    doc["content"] = "changed by the writer"
+
+    first = cache.get("a")
+    first["content"] = "changed by a reader"
+
+    assert cache.get("a")["content"] == "original"
+
+
+def test_cache_evicts_least_recently_used_over_byte_budget():
+    """The cache stays within its byte budget and drops oversized documents."""
+    cache = DocumentCache(maxbytes=7000)
+    cache.put("a", {"content": "x" * 1500})
+    cache.put("b", {"content": "x" * 1500})
+    cache.get("a")
+    cache.put("c", {"content": "x" * 1500})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    cache.put("huge", {"content": "x" * 10000})
+    assert cache.get("huge") is None
+
+
+def test_cache_byte_count_follows_replacements_and_invalidation():
+    cache = DocumentCache(maxbytes=7000)
+    cache.put("a", {"content": "x" * 1500})
+    cache.put("a", {"content": "x" * 2000})
+    cache.put("b", {"content": "x" * 1500})
+    cache.invalidate("b", "missing", None)
+
+    cache.put("c", {"content": "x" * 2900})
+
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_cache_entries_expire():
+    cache = DocumentCache(ttl=0.0)
+    cache.put("a", {"content": ""})
+
+    assert cache.get("a") is None
@@ -0,0 +1,154 @@
+"""
+Unit tests for the background task helpers that do not need the RAG pipeline.
+"""
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import tasks
+
+
+class ClaimingRepository:
+    """Stands in for the task repository, claiming whatever IDs it knows."""
+
+    def __init__(self, *doc_ids):
+        self.docs = {doc_id: {"id": doc_id, "status": "pending"} for doc_id in doc_ids}
+        self.calls = []
+
+    async def claim_documents(self, doc_ids):
+        self.calls.append(("claim_documents", doc_ids))
+        return [{**self.docs[doc_id], "status": "processing"} for doc_id in doc_ids if doc_id in self.docs]
+
+    def __getattr__(self, name):
+        async def record(*args):
+            self.calls.append((name, *args))
+        return record
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Record single-document processing instead of running the pipeline."""
+    calls = []
+
+    async def process_document_background(doc_id, doc_data=None):
+        calls.append((doc_id, doc_data))
+
+    monkeypatch.setattr(tasks, "process_document_background", process_document_background)
+    return calls
+
+
+def test_single_document_batch_is_claimed_in_one_statement(monkeypatch, processed):
+    """A batch of one is claimed and handed over with its data, so it is never re-read."""
+    repo = ClaimingRepository("a")
+    monkeypatch.setattr(tasks, "task_repository", lambda: repo)
+
+    asyncio.run(tasks.process_documents_batch(["a"]))
+
+    assert repo.calls == [("claim_documents", ["a"])]
+    assert processed == [("a", {"id": "a", "status": "processing"})]
+
+
+def test_unknown_single_document_is_skipped(monkeypatch, processed):
+    monkeypatch.setattr(tasks, "task_repository", lambda: ClaimingRepository())
+
+    asyncio.run(tasks.process_documents_batch(["missing"]))
+
+    assert processed == []
+
+
+class DueRepository:
+    def __init__(self, due):
+        self.due = due
+
+    async def get_next_retry_due(self):
+        return self.due
+
+
+@pytest.mark.parametrize("due, expected", [
+    (None, 900),
+    ("", 0),
+    ((datetime.utcnow() - timedelta(minutes=1)).isoformat(), 0),
+    ((datetime.utcnow() + timedelta(hours=1)).isoformat(), 900),
+])
+def test_seconds_until_next_retry(monkeypatch, due, expected):
+    """The retry loop sleeps until the earliest due document, within [0, max_wait]."""
+    monkeypatch.setattr(tasks, "task_repository", lambda: DueRepository(due))
+
+    assert asyncio.run(tasks.seconds_until_next_retry(900)) == expected
+
+
+def test_seconds_until_next_retry_waits_for_scheduled_document(monkeypatch):
+    due = (datetime.utcnow() + timedelta(minutes=2)).isoformat()
+    monkeypatch.setattr(tasks, "task_repository", lambda: DueRepository(due))
+
+    assert 110 < asyncio.run(tasks.seconds_until_next_retry(900)) <= 120
+
+
+@pytest.fixture
+def retry_cycles(monkeypatch):
+    """Record retry cycle runs instead of claiming documents, under a fresh lock."""
+    runs = []
+
+    async def run_retry_cycle():
+        runs.append(True)
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(tasks, "_retry_cycle_lock", asyncio.Lock())
+    monkeypatch.setattr(tasks, "_run_retry_cycle", run_retry_cycle)
+    return runs
+
+
+def test_retry_cycle_runs_when_idle(retry_cycles):
+    asyncio.run(tasks.retry_failed_documents_task())
+
+    assert len(retry_cycles) == 1
+
+
+def test_overlapping_retry_cycle_is_skipped(retry_cycles):
+    """A cycle started while another runs returns at once instead of claiming."""
+    async def overlap():
+        await asyncio.gather(
+            tasks.retry_failed_documents_task(),
+            tasks.retry_failed_documents_task()
+        )
+
+    asyncio.run(overlap())
+
+    assert len(retry_cycles) == 1
+
+
+def test_retry_cycles_run_again_once_finished(retry_cycles):
+    async def back_to_back():
+        await tasks.retry_failed_documents_task()
+        await tasks.retry_failed_documents_task()
+
+    asyncio.run(back_to_back())
+
+    assert len(retry_cycles) == 2
+
+
+class ThreadRecordingPipeline:
+    def __init__(self):
+        self.threads = []
+
+    def run(self, data):
+        self.threads.append(threading.current_thread().name)
+        return {"writer": {"documents_written": len(data["documents"])}}
+
+
+def test_indexing_runs_on_its_own_executor(monkeypatch):
+    """Pipeline runs use the dedicated indexing threads, not the default executor."""
+    pipeline = ThreadRecordingPipeline()
+    monkeypatch.setattr(tasks, "get_indexing_pipeline", lambda: pipeline)
+    doc = {"id": "a", "content": "text", "title": "t", "type": "note",
+           "source_url": None, "tags": [], "created_at": "2024-01-01T00:00:00"}
+
+    try:
+        asyncio.run(tasks._index_documents([doc]))
+    finally:
+        tasks.shutdown_indexing_executor()
+
+    assert len(pipeline.threads) == 1
+    assert pipeline.threads[0].startswith("indexing")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Verify all dependencies installed correctly"""
+from importlib.metadata import version
 
 print("Checking core dependencies...")
 
@@ -20,15 +21,15 @@ import psycopg
 import asyncpg
 print("✅ PostgreSQL drivers OK")
 
-# ML/NLP
-import numpy
-import transformers
-import nltk
-import sklearn
-print(f"✅ ML libraries OK (numpy {numpy.__version__})")
+# ML/NLP: only the installed versions are needed, so read the distribution
+# metadata instead of importing these heavy packages
+numpy_version = version("numpy")
+for distribution in ("transformers", "nltk", "scikit-learn"):
+    version(distribution)  # Raises PackageNotFoundError when missing
+print(f"✅ ML libraries OK (numpy {numpy_version})")
 
 # Warnings
-if numpy.__version__.startswith("2."):
+if numpy_version.startswith("2."):
     print("⚠️  WARNING: NumPy 2.x detected!")
 
 print("\n🎉 All dependencies installed successfully!")